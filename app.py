@@ -8,6 +8,7 @@ import re
 import io
 import zipfile
 import os
+from contextlib import asynccontextmanager
 from typing import List
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -16,7 +17,7 @@ from pydantic import BaseModel
 import uvicorn
 
 from spider.baidu_search import BaiduSimilarImageSpider
-from main import get_proxy
+from utils.search_cache import SearchCache
 
 # 配置日志
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(name)s - line : %(lineno)s - %(funcName)s : %(message)s', 
@@ -24,11 +25,28 @@ logging.basicConfig(format='%(asctime)s - %(levelname)s - %(name)s - line : %(li
                     datefmt='%Y-%m-%d %H:%M:%S')
 logger = logging.getLogger(__name__)
 
+# 初始化爬虫，搜索结果缓存与 main.py 的爬取任务共用
+search_cache = SearchCache()
+spider = BaiduSimilarImageSpider(search_cache=search_cache)
+
+
+# 使用 lifespan 管理爬虫共享会话的生命周期
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await spider.get_session()
+    # 启动时预先生成 acs-token，上传请求无需等待浏览器
+    spider.token_manager.start()
+    yield
+    await spider.close()
+    search_cache.close()
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title="相似图片搜索API",
     description="上传图片获取相似图片URL列表",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 添加CORS中间件
@@ -40,10 +58,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 初始化爬虫
-spider = BaiduSimilarImageSpider()
-
-
 # Pydantic模型用于base64请求
 class Base64ImageRequest(BaseModel):
     image_data: str
@@ -220,17 +234,18 @@ async def process_image_search(image_bytes: bytes) -> JSONResponse:
     proxy = None
     logger.info(f"使用代理: {proxy}")
     
-    # 1. 使用图片搜索相似图片
-    search_url = await spider(image_bytes=image_bytes, proxy=proxy)
+    # 1. 使用图片搜索相似图片，一次请求同时拿到搜索URL和结果列表
+    result = await spider.search(image_bytes=image_bytes, proxy=proxy)
     
-    if not search_url:
+    if not result:
         raise HTTPException(
             status_code=500,
             detail="搜索失败，无法获取搜索URL"
         )
     
     # 2. 获取相似图片URL列表
-    images_url = await spider.postprocess(search_url)
+    search_url = result["search_url"]
+    images_url = result["images_url"]
     
     if not images_url:
         raise HTTPException(
@@ -282,18 +297,16 @@ async def download_selected_images(request: DownloadRequest):
     temp_dir = tempfile.mkdtemp()
     
     try:
-        conn = aiohttp.TCPConnector(limit=10)
         timeout = aiohttp.ClientTimeout(total=30)
+        session = await spider.get_session()
+        semaphore = asyncio.Semaphore(10)
         
-        async with aiohttp.ClientSession(connector=conn, timeout=timeout) as session:
-            semaphore = asyncio.Semaphore(10)
-            
-            async def download_with_semaphore(url):
-                async with semaphore:
-                    return await download_image(session, url, temp_dir)
-            
-            tasks = [download_with_semaphore(url) for url in urls]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        async def download_with_semaphore(url):
+            async with semaphore:
+                return await download_image(session, url, temp_dir, timeout=timeout)
+        
+        tasks = [download_with_semaphore(url) for url in urls]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # 过滤成功下载的文件
         downloaded_files = [r for r in results if r is not None and not isinstance(r, Exception)]
@@ -326,7 +339,8 @@ async def download_selected_images(request: DownloadRequest):
 @app.get("/health")
 async def health_check():
     """健康检查接口"""
-    return {"status": "healthy", "message": "服务运行正常"}
+    return {"status": "healthy", "message": "服务运行正常", "token": spider.token_manager.summary(),
+            "search_cache": search_cache.summary()}
 
 
 if __name__ == "__main__":
@@ -4,11 +4,24 @@ import aiohttp
 import aiofiles
 from urllib.parse import urlparse
 import logging
+import hashlib
+import tempfile
 from pathlib import Path
 
+from utils.content_store import guess_extension
+
 logger = logging.getLogger(__name__)
 
-async def download_image(session, url, save_dir, proxy=None):
+# 流式写盘的默认分块大小
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLargeError(Exception):
+    """下载内容超过单文件大小上限"""
+
+
+async def download_image(session, url, save_dir, proxy=None, timeout=None,
+                         chunk_size=DEFAULT_CHUNK_SIZE, max_size=None, store=None, stats=None):
     """
     异步下载单个图片
     
@@ -17,37 +30,67 @@ async def download_image(session, url, save_dir, proxy=None):
         url: 图片URL
         save_dir: 保存目录
         proxy: 代理地址
+        timeout: 单次请求超时(aiohttp.ClientTimeout)，为None时使用会话默认值
+        chunk_size: 流式写盘的分块大小(字节)
+        max_size: 单个文件的最大字节数，超过则放弃下载，为None时不限制
+        store: 内容寻址存储(utils.content_store.ContentStore)，提供时忽略save_dir，
+            已下载过的URL直接返回已有文件，相同内容只保存一份
+        stats: 可选的统计字典，累加 bytes(实际传输字节数，含失败和中止的下载)、
+            saved_bytes(成功保存的图片字节数)、downloaded、cached、failed
     
     Returns:
         保存的文件路径或None（如果下载失败）
     """
+    path = await _download_image(session, url, save_dir, proxy, timeout, chunk_size, max_size, store, stats)
+    if stats is not None and path is None:
+        stats["failed"] = stats.get("failed", 0) + 1
+    return path
+
+async def _download_image(session, url, save_dir, proxy, timeout, chunk_size, max_size, store, stats):
     try:
-        # 从URL中提取文件名
-        parsed_url = urlparse(url)
-        filename = os.path.basename(parsed_url.path)
-        
-        # 如果文件名为空或没有扩展名，使用URL的哈希值作为文件名
-        if not filename or '.' not in filename:
-            filename = f"{hash(url)}.jpg"
-        
-        # 确保文件名唯一
-        save_path = os.path.join(save_dir, filename)
-        count = 1
-        while os.path.exists(save_path):
-            name, ext = os.path.splitext(filename)
-            save_path = os.path.join(save_dir, f"{name}_{count}{ext}")
-            count += 1
+        if store is not None:
+            cached_path = store.lookup(url)
+            if cached_path:
+                logger.debug(f"命中已下载URL: {url} -> {cached_path}")
+                if stats is not None:
+                    stats["cached"] = stats.get("cached", 0) + 1
+                return cached_path
+        else:
+            save_path = _unique_save_path(url, save_dir)
         
         # 发送请求下载图片
-        async with session.get(url, proxy=proxy) as response:
+        request_kwargs = {"proxy": proxy}
+        if timeout is not None:
+            request_kwargs["timeout"] = timeout
+        async with session.get(url, **request_kwargs) as response:
             if response.status == 200:
-                # 异步写入文件
-                async with aiofiles.open(save_path, 'wb') as f:
-                    await f.write(await response.read())
+                if max_size is not None and response.content_length is not None \
+                        and response.content_length > max_size:
+                    raise ImageTooLargeError(f"Content-Length {response.content_length} 超过上限 {max_size}")
+                # 分块写入临时文件，完成后原子重命名，避免留下不完整的文件
+                if store is not None:
+                    hasher = hashlib.sha256()
+                    tmp_path = await _stream_to_temp(response, store.tmp_dir, chunk_size, max_size, hasher, stats)
+                    size = os.path.getsize(tmp_path)
+                    ext = guess_extension(url, response.headers.get("Content-Type"))
+                    save_path = store.add_file(url, tmp_path, hasher.hexdigest(), ext)
+                else:
+                    tmp_path = await _stream_to_temp(response, save_dir, chunk_size, max_size, stats=stats)
+                    try:
+                        size = os.path.getsize(tmp_path)
+                        os.replace(tmp_path, save_path)
+                    except BaseException:
+                        _discard(tmp_path)
+                        raise
+                if stats is not None:
+                    stats["saved_bytes"] = stats.get("saved_bytes", 0) + size
+                    stats["downloaded"] = stats.get("downloaded", 0) + 1
                 logger.info(f"成功下载: {url} -> {save_path}")
                 return save_path
             else:
                 logger.error(f"下载失败 {url}, 状态码: {response.status}")
+                # 错误页同样消耗带宽，读完计入统计
+                await _drain(response, chunk_size, max_size, stats)
                 return None
     except Exception as e:
         # import traceback
@@ -55,7 +98,81 @@ async def download_image(session, url, save_dir, proxy=None):
         logger.error(f"下载 {url} 时出错: {str(e)}")
         return None
 
-async def download_images(images_url, save_dir, proxy=None, max_concurrent=1):
+def _unique_save_path(url, save_dir):
+    """根据URL生成不与已有文件冲突的保存路径"""
+    # 从URL中提取文件名
+    parsed_url = urlparse(url)
+    filename = os.path.basename(parsed_url.path)
+    
+    # 如果文件名为空或没有扩展名，使用URL的哈希值作为文件名(跨进程稳定)
+    if not filename or '.' not in filename:
+        filename = f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.jpg"
+    
+    # 确保文件名唯一
+    save_path = os.path.join(save_dir, filename)
+    count = 1
+    while os.path.exists(save_path):
+        name, ext = os.path.splitext(filename)
+        save_path = os.path.join(save_dir, f"{name}_{count}{ext}")
+        count += 1
+    return save_path
+
+def _count_bytes(stats, size):
+    if stats is not None:
+        stats["bytes"] = stats.get("bytes", 0) + size
+
+async def _drain(response, chunk_size, max_size, stats):
+    """读取并丢弃响应体，只统计传输字节数，超过 max_size 时停止"""
+    received = 0
+    async for chunk in response.content.iter_chunked(chunk_size):
+        received += len(chunk)
+        _count_bytes(stats, len(chunk))
+        if max_size is not None and received > max_size:
+            break
+
+async def _stream_to_temp(response, tmp_dir, chunk_size, max_size, hasher=None, stats=None):
+    """
+    将响应体分块写入临时文件，调用方负责将其重命名到最终位置
+    
+    Args:
+        response: aiohttp响应
+        tmp_dir: 临时文件目录(需与最终位置在同一文件系统)
+        chunk_size: 分块大小
+        max_size: 最大字节数，为None时不限制
+        hasher: 可选的hashlib对象，写入时同步计算摘要
+        stats: 可选的统计字典，每收到一块就累加 bytes，中途失败时已传输的字节同样计入
+    
+    Returns:
+        str: 临时文件路径
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+    os.close(fd)
+    written = 0
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                written += len(chunk)
+                _count_bytes(stats, len(chunk))
+                if max_size is not None and written > max_size:
+                    raise ImageTooLargeError(f"已接收 {written} 字节，超过上限 {max_size}")
+                if hasher is not None:
+                    hasher.update(chunk)
+                await f.write(chunk)
+        return tmp_path
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+def _discard(path):
+    """删除临时文件，文件已不存在时忽略"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+async def download_images(images_url, save_dir, proxy=None, max_concurrent=1, session=None,
+                          chunk_size=DEFAULT_CHUNK_SIZE, max_size=None, store=None, on_result=None,
+                          stats=None):
     """
     异步下载多个图片
     
@@ -63,6 +180,14 @@ async def download_images(images_url, save_dir, proxy=None, max_concurrent=1):
         images_url: 图片URL列表
         proxy: 代理地址
         max_concurrent: 最大并发数
+        session: 共享的aiohttp会话(如 BaiduSimilarImageSpider.get_session())，
+            为None时临时创建一个会话并在结束时关闭
+        chunk_size: 流式写盘的分块大小(字节)
+        max_size: 单个文件的最大字节数，为None时不限制
+        store: 内容寻址存储，提供时按内容去重保存，已下载过的URL不再请求
+        on_result: 每个URL下载结束时的回调 on_result(url, path)，失败时path为None
+        stats: 可选的统计字典，累加实际传输字节数、成功保存的字节数与成功/命中/失败数，
+            可用于计算每张可用图片消耗的带宽
     
     Returns:
         成功下载的图片路径列表
@@ -71,30 +196,45 @@ async def download_images(images_url, save_dir, proxy=None, max_concurrent=1):
     # save_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "download_image")
     os.makedirs(save_dir, exist_ok=True)
     
-    # 设置连接池限制和超时
-    conn = aiohttp.TCPConnector(limit=max_concurrent)
     timeout = aiohttp.ClientTimeout(total=5)
+    download_kwargs = {"timeout": timeout, "chunk_size": chunk_size, "max_size": max_size, "store": store,
+                       "stats": stats}
+    if session is not None:
+        return await _download_all(session, images_url, save_dir, proxy, max_concurrent, download_kwargs,
+                                   on_result)
+
+    # 设置连接池限制
+    conn = aiohttp.TCPConnector(limit=max_concurrent)
     
     # 创建会话
-    async with aiohttp.ClientSession(connector=conn, timeout=timeout) as session:
-        # 使用信号量限制并发数
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        async def download_with_semaphore(url):
-            async with semaphore:
-                return await download_image(session, url, save_dir, proxy)
-        
-        # 创建下载任务
-        tasks = [download_with_semaphore(url) for url in images_url]
-        
-        # 等待所有任务完成
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # 过滤出成功的下载
-        successful_downloads = [r for r in results if r is not None and not isinstance(r, Exception)]
-        
-        logger.info(f"下载完成: 总计 {len(images_url)} 张图片, 成功 {len(successful_downloads)} 张")
-        return successful_downloads
+    async with aiohttp.ClientSession(connector=conn, timeout=timeout) as own_session:
+        return await _download_all(own_session, images_url, save_dir, proxy, max_concurrent, download_kwargs,
+                                   on_result)
+
+async def _download_all(session, images_url, save_dir, proxy, max_concurrent, download_kwargs,
+                        on_result=None):
+    """在给定会话上以有限并发下载全部图片"""
+    # 使用信号量限制并发数
+    semaphore = asyncio.Semaphore(max_concurrent)
+    
+    async def download_with_semaphore(url):
+        async with semaphore:
+            path = await download_image(session, url, save_dir, proxy, **download_kwargs)
+        if on_result is not None:
+            on_result(url, path)
+        return path
+    
+    # 创建下载任务
+    tasks = [download_with_semaphore(url) for url in images_url]
+    
+    # 等待所有任务完成
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # 过滤出成功的下载
+    successful_downloads = [r for r in results if r is not None and not isinstance(r, Exception)]
+    
+    logger.info(f"下载完成: 总计 {len(images_url)} 张图片, 成功 {len(successful_downloads)} 张")
+    return successful_downloads
 
 def download_images_sync(images_url, save_dir, proxy=None, max_concurrent=10):
     """
@@ -4,6 +4,7 @@
 # @FileName:   main.py
 
 
+import time
 import asyncio
 from math import log
 import os
@@ -16,8 +17,12 @@ from weakref import proxy
 import requests
 import json
 
-from spider.baidu_search import BaiduSimilarImageSpider
+from spider.baidu_search import BaiduSimilarImageSpider, select_image_url
 from download_image import download_images
+from utils.content_store import ContentStore
+from utils.crawl_state import CrawlState, SEED_DONE, SEED_SEARCHED
+from utils.proxy_client import ProxyClient
+from utils.search_cache import SearchCache, DEFAULT_SEARCH_CACHE
 
 # 配置日志
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(name)s - line : %(lineno)s - %(funcName)s : %(message)s', 
@@ -26,91 +31,344 @@ logging.basicConfig(format='%(asctime)s - %(levelname)s - %(name)s - line : %(li
 logger = logging.getLogger(__name__)
 
 
-def get_proxy() -> str:
+async def search_seed(spider, state, image_path, image_name, proxy_client, max_results=100,
+                      fetch_mode="thumb", max_pixels=None):
     """
-    从API获取代理地址
+    搜索单张种子图片并持久化结果
+    
+    已搜索过的种子不会重新上传，直接返回其尚未下载成功的URL
+    
+    Args:
+        spider: BaiduSimilarImageSpider 实例
+        state: CrawlState 实例
+        image_path: 种子图片目录
+        image_name: 种子图片文件名
+        proxy_client: ProxyClient 实例，上传使用 upload 能力的租约代理
+        max_results: 最多保留的相似图片数
+        fetch_mode: 下载模式 thumb / original / best
+        max_pixels: best 模式下原图允许的最大像素数
     
     Returns:
-        str: 代理地址，如果获取失败则返回空字符串
+        list: 待下载的相似图片URL列表
     """
+    if state.get_status(image_name) == SEED_SEARCHED:
+        images_url = state.pending_urls(image_name)
+        logger.info(f"{image_name} 已搜索过，跳过上传，剩余 {len(images_url)} 张待下载")
+        return images_url
+
+    state.mark_searching(image_name)
     try:
-        url = "http://localhost:8000/proxy"
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("success") and "data" in data and "proxy" in data["data"]:
-                return data["data"]["proxy"]
-        return ""
+        with open(os.path.join(image_path, image_name), "rb") as f:
+            image_bytes = f.read()
+        # 先查搜索缓存，命中时不租用代理，也不会把未经过代理的耗时记到租约上
+        result = await spider.search_cached(image_bytes, limit=max_results, fetch_mode=fetch_mode,
+                                            max_pixels=max_pixels)
+        if result is None:
+            async with proxy_client.use("upload") as lease:
+                proxy = lease.proxy if lease else None
+                logger.info(f"使用代理: {proxy}")
+                # 只有上传请求经过代理，每次上传的结果记录在租约中，归还时汇总反馈给代理池
+                result = await spider.search(image_bytes=image_bytes, proxy=proxy, limit=max_results,
+                                             fetch_mode=fetch_mode, max_pixels=max_pixels, use_cache=False,
+                                             on_upload=lease.record if lease else None)
+        if not result:
+            raise RuntimeError("无法获取搜索URL")
+        search_url = result["search_url"]
+        images_url = result["images_url"][:max_results]
+        # 一次请求最多返回 max_page_size 条，需要更多结果时逐页请求后续结果 (结果接口不经过代理)
+        if max_results > len(images_url) and len(result["items"]) >= spider.max_page_size:
+            images_url = await _collect_urls(spider, search_url, max_results, fetch_mode, max_pixels,
+                                             images_url)
     except Exception as e:
-        print(f"获取代理失败: {str(e)}")
-        return ""
+        state.mark_failed(image_name, e)
+        raise
+
+    state.mark_searched(image_name, search_url, images_url)
+    return images_url
 
-async def search_and_download(image_path, save_dir, start_image=0):
+
+async def _collect_urls(spider, search_url, max_results, fetch_mode, max_pixels, first_page):
+    """通过 iter_results 逐页收集最多 max_results 个URL，后续页请求失败时保留已收集的结果"""
+    images_url = []
+    try:
+        async for record in spider.iter_results(search_url, limit=max_results, page_size=spider.max_page_size):
+            url = select_image_url(record, fetch_mode, max_pixels)
+            if url:
+                images_url.append(url)
+    except Exception as e:
+        logger.warning(f"请求后续结果页失败，使用已获取的结果: {str(e)}")
+    return images_url if len(images_url) > len(first_page) else first_page
+
+
+async def download_seed(spider, state, store, image_name, images_url, save_dir, proxy_client, stats=None):
     """
-    执行循环搜索和下载过程
+    下载单张种子图片的相似图片，并逐个记录下载状态
     
     Args:
-        image_path: 初始图片路径
-        proxy: 代理设置
+        stats: 可选的下载统计字典，累加传输字节数与成功/命中/失败数
+    
+    Returns:
+        list: 成功下载的图片路径列表
+    """
+    session = await spider.get_session()
+    # 本轮单独统计，命中内容存储的图片没有经过代理，不计入代理结果
+    seed_stats = {}
+    async with proxy_client.use("download") as lease:
+        proxy = lease.proxy if lease else None
+        logger.info(f"使用代理下载图片: {proxy}")
+        start = time.monotonic()
+        downloaded_files = await download_images(
+            images_url, save_dir, proxy, session=session, store=store,
+            on_result=lambda url, path: state.mark_url(image_name, url, path), stats=seed_stats,
+        )
+        elapsed = time.monotonic() - start
+        # 以实际网络下载的成功率过半作为本轮的代理结果，耗时按实际请求数平均
+        requested = seed_stats.get("downloaded", 0) + seed_stats.get("failed", 0)
+        if lease and requested:
+            lease.record(seed_stats.get("downloaded", 0) * 2 >= requested, elapsed / requested)
+    if stats is not None:
+        for key, value in seed_stats.items():
+            stats[key] = stats.get(key, 0) + value
+    state.finish_seed(image_name)
+    return downloaded_files
+
+
+def _log_bandwidth(stats):
+    """输出本次运行的下载带宽统计，传输字节包含失败和中止的下载"""
+    downloaded = stats.get("downloaded", 0)
+    total_bytes = stats.get("bytes", 0)
+    saved_bytes = stats.get("saved_bytes", 0)
+    per_image = total_bytes / downloaded if downloaded else 0
+    logger.info(f"下载传输 {total_bytes / 1024 / 1024:.2f} MB (其中可用图片 {saved_bytes / 1024 / 1024:.2f} MB)，"
+                f"新下载 {downloaded} 张，命中已有 {stats.get('cached', 0)} 张，失败 {stats.get('failed', 0)} 张，"
+                f"平均每张可用图片传输 {per_image / 1024:.1f} KB")
+
+
+def _list_seeds(image_path, state, start_image=0):
+    """按文件名排序列出种子图片并登记到状态库，返回尚未完成的种子"""
+    images_name = sorted(os.listdir(image_path))[start_image:]
+    state.add_seeds(images_name)
+    return [name for name in images_name if state.get_status(name) != SEED_DONE]
+
+
+async def search_and_download(image_path, save_dir, start_image=0, state_db=None, max_results=100,
+                              proxy_api="http://localhost:8000", fetch_mode="thumb", max_pixels=None,
+                              upload_max_edge=None, upload_quality=85, search_cache=DEFAULT_SEARCH_CACHE):
     """
-    spider = BaiduSimilarImageSpider()
+    执行循环搜索和下载过程
     
+    Args:
+        image_path: 种子图片目录
+        save_dir: 保存图片路径
+        start_image: 从排序后的第几张种子图片开始
+        state_db: 爬取状态数据库路径，默认为 save_dir/crawl_state.sqlite3
+        max_results: 每张种子图片最多下载的相似图片数
+        proxy_api: 代理池 API 地址
+        fetch_mode: 下载模式，thumb 缩略图 / original 原图 / best 不超过 max_pixels 的原图，否则缩略图
+        max_pixels: best 模式下原图允许的最大像素数
+        upload_max_edge: 上传前把种子图片长边缩小到该像素数并重新编码为 JPEG，为None时上传原图
+        upload_quality: 重新编码的 JPEG 质量
+        search_cache: 持久化搜索缓存路径，与搜索服务共用；为None时不使用缓存
+    """
+    store = ContentStore(save_dir)
+    state = CrawlState(state_db or os.path.join(save_dir, "crawl_state.sqlite3"))
+    cache = SearchCache(search_cache) if search_cache else None
+    try:
+        async with BaiduSimilarImageSpider(upload_max_edge, upload_quality, cache) as spider, ProxyClient(proxy_api) as proxy_client:
+            search_options = {"max_results": max_results, "fetch_mode": fetch_mode, "max_pixels": max_pixels}
+            await _search_and_download(spider, state, store, proxy_client, image_path, save_dir,
+                                       start_image, search_options)
+    finally:
+        state.close()
+        store.close()
+        if cache is not None:
+            logger.info(f"搜索缓存: {cache.summary()}")
+            cache.close()
+
+
+async def _search_and_download(spider, state, store, proxy_client, image_path, save_dir, start_image,
+                               search_options):
     # 读取初始图片
     logger.info(f"开始循环搜索，初始图片: {image_path}")
-    images_name = os.listdir(image_path)
-    logger.info(f"共 {len(images_name)} 张图片")
+    images_name = _list_seeds(image_path, state, start_image)
+    logger.info(f"共 {len(images_name)} 张图片待处理")
     total_image_num = 0
+    download_stats = {}
     for idx, image_name in enumerate(images_name):
-        if idx < start_image:
-            continue
         logger.info(f"开始第 {idx}/{len(images_name)} 张图片的搜索")
         logger.info(f"使用图片进行搜索: {image_name} ")
-        with open(os.path.join(image_path, image_name), "rb") as f:
-            image_bytes = f.read()
         # 1. 使用图片搜索相似图片
-        proxy = get_proxy()
-        logger.info(f"使用代理: {proxy}")
         try:
-            search_url = await spider(image_bytes=image_bytes, proxy=proxy)
+            images_url = await search_seed(spider, state, image_path, image_name, proxy_client,
+                                           **search_options)
         except Exception as e:
-            print(os.path.join(image_path, image_name))
-            logger.error(f"搜索失败: {str(e)}")
-            break
-        
+            logger.error(f"搜索失败 {os.path.join(image_path, image_name)}: {str(e)}")
+            continue
 
-        if not search_url:
-            logger.error("搜索失败，终止循环")
-            break
-        
-        # 2. 获取相似图片URL列表
-        images_url = await spider.postprocess(search_url)
-        images_url = images_url[:100]
         if not images_url:
-            logger.error("未找到相似图片，终止循环")
-            break
+            logger.warning(f"未找到待下载的相似图片: {image_name}")
+            state.finish_seed(image_name)
+            continue
         
         logger.info(f"找到 {len(images_url)} 张相似图片")
         
-        # 3. 下载相似图片
-        # proxy = get_proxy()
-        logger.info(f"使用代理下载图片: {proxy}")
-        downloaded_files = await download_images(images_url, save_dir, proxy)
-        if not downloaded_files:
-            logger.error("下载图片失败，终止循环")
-            break
-        
+        # 2. 下载相似图片
+        downloaded_files = await download_seed(spider, state, store, image_name, images_url, save_dir,
+                                               proxy_client, download_stats)
         logger.info(f"成功下载 {len(downloaded_files)} 张图片")
         total_image_num += len(downloaded_files)
 
     logger.info(f"总共下载 {total_image_num} 张图片")
+    _log_bandwidth(download_stats)
+    logger.info(f"存储统计: {store.stats}")
+    logger.info(f"爬取状态: {state.summary()}")
     logger.info("循环搜索完成")
 
 
+async def search_and_download_pipeline(image_path, save_dir, start_image=0,
+                                       search_concurrency=4, download_concurrency=4,
+                                       queue_size=None, max_results=100, state_db=None,
+                                       proxy_api="http://localhost:8000", fetch_mode="thumb", max_pixels=None,
+                                       upload_max_edge=None, upload_quality=85,
+                                       search_cache=DEFAULT_SEARCH_CACHE):
+    """
+    并发流水线模式：搜索阶段与下载阶段各自拥有独立的 worker 池，
+    通过有界 asyncio 队列衔接，下载跟不上时搜索会被反压阻塞
+    
+    Args:
+        image_path: 种子图片目录
+        save_dir: 保存图片路径
+        start_image: 从排序后的第几张种子图片开始
+        search_concurrency: 同时进行搜索(上传 + 解析)的种子数
+        download_concurrency: 同时进行下载的种子数
+        queue_size: 阶段间队列容量，默认为对应阶段并发数的 2 倍
+        max_results: 每张种子图片最多下载的相似图片数
+        state_db: 爬取状态数据库路径，默认为 save_dir/crawl_state.sqlite3
+        proxy_api: 代理池 API 地址，各 worker 共享缓存的租约
+        fetch_mode: 下载模式 thumb / original / best
+        max_pixels: best 模式下原图允许的最大像素数
+        upload_max_edge: 上传前把种子图片长边缩小到该像素数并重新编码为 JPEG，为None时上传原图
+        upload_quality: 重新编码的 JPEG 质量
+        search_cache: 持久化搜索缓存路径，与搜索服务共用；为None时不使用缓存
+    
+    Returns:
+        int: 总共下载的图片数量
+    """
+    store = ContentStore(save_dir)
+    state = CrawlState(state_db or os.path.join(save_dir, "crawl_state.sqlite3"))
+    cache = SearchCache(search_cache) if search_cache else None
+    try:
+        async with BaiduSimilarImageSpider(upload_max_edge, upload_quality, cache) as spider, ProxyClient(proxy_api) as proxy_client:
+            search_options = {"max_results": max_results, "fetch_mode": fetch_mode, "max_pixels": max_pixels}
+            return await _search_and_download_pipeline(
+                spider, state, store, proxy_client, image_path, save_dir, start_image, search_concurrency,
+                download_concurrency, queue_size, search_options,
+            )
+    finally:
+        state.close()
+        store.close()
+        if cache is not None:
+            logger.info(f"搜索缓存: {cache.summary()}")
+            cache.close()
+
+
+async def _search_and_download_pipeline(spider, state, store, proxy_client, image_path, save_dir, start_image,
+                                        search_concurrency, download_concurrency,
+                                        queue_size, search_options):
+    images_name = _list_seeds(image_path, state, start_image)
+    logger.info(f"开始流水线搜索，种子目录: {image_path}，共 {len(images_name)} 张图片待处理")
+    logger.info(f"搜索并发: {search_concurrency}，下载并发: {download_concurrency}")
+
+    seed_queue = asyncio.Queue(maxsize=queue_size or search_concurrency * 2)
+    download_queue = asyncio.Queue(maxsize=queue_size or download_concurrency * 2)
+    stats = {"searched": 0, "search_failed": 0, "downloaded": 0}
+    download_stats = {}
+
+    async def producer():
+        for idx, image_name in enumerate(images_name):
+            await seed_queue.put((idx, image_name))
+        for _ in range(search_concurrency):
+            await seed_queue.put(None)
+
+    async def search_worker(worker_id):
+        while True:
+            item = await seed_queue.get()
+            if item is None:
+                break
+            idx, image_name = item
+            logger.info(f"[search-{worker_id}] 开始第 {idx}/{len(images_name)} 张图片的搜索: {image_name}")
+            try:
+                images_url = await search_seed(spider, state, image_path, image_name, proxy_client,
+                                               **search_options)
+            except Exception as e:
+                stats["search_failed"] += 1
+                logger.error(f"[search-{worker_id}] 搜索失败 {image_name}: {str(e)}")
+                continue
+
+            stats["searched"] += 1
+            if not images_url:
+                logger.warning(f"[search-{worker_id}] 未找到待下载的相似图片: {image_name}")
+                state.finish_seed(image_name)
+                continue
+            logger.info(f"[search-{worker_id}] {image_name} 找到 {len(images_url)} 张相似图片")
+            # 队列已满时在此等待，形成反压
+            await download_queue.put((image_name, images_url))
+
+    async def download_worker(worker_id):
+        while True:
+            item = await download_queue.get()
+            if item is None:
+                break
+            image_name, images_url = item
+            try:
+                downloaded_files = await download_seed(spider, state, store, image_name, images_url,
+                                                       save_dir, proxy_client, download_stats)
+            except Exception as e:
+                logger.error(f"[download-{worker_id}] 下载失败 {image_name}: {str(e)}")
+                continue
+            stats["downloaded"] += len(downloaded_files)
+            logger.info(f"[download-{worker_id}] {image_name} 成功下载 {len(downloaded_files)} 张图片")
+
+    search_tasks = [asyncio.create_task(search_worker(i)) for i in range(search_concurrency)]
+    download_tasks = [asyncio.create_task(download_worker(i)) for i in range(download_concurrency)]
+    try:
+        await producer()
+        await asyncio.gather(*search_tasks)
+        for _ in range(download_concurrency):
+            await download_queue.put(None)
+        await asyncio.gather(*download_tasks)
+    finally:
+        for task in search_tasks + download_tasks:
+            task.cancel()
+
+    logger.info(f"搜索成功 {stats['searched']} 张，失败 {stats['search_failed']} 张")
+    logger.info(f"总共下载 {stats['downloaded']} 张图片")
+    _log_bandwidth(download_stats)
+    logger.info(f"存储统计: {store.stats}")
+    logger.info(f"爬取状态: {state.summary()}")
+    logger.info("流水线搜索完成")
+    return stats["downloaded"]
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="循环搜索和下载相似图片")
     parser.add_argument("--image", type=str, default="/Users/lixumin/Desktop/data/question/reading", help="初始图片路径")
     parser.add_argument("--save_dir", type=str, default="/Users/lixumin/Desktop/data/question/reading-spider-image", help="保存图片路径")
+    parser.add_argument("--start_image", type=int, default=0, help="从排序后的第几张种子图片开始")
+    parser.add_argument("--state_db", type=str, default=None, help="爬取状态数据库路径，默认保存在 save_dir 下")
+    parser.add_argument("--pipeline", action="store_true", help="使用并发流水线模式")
+    parser.add_argument("--search_concurrency", type=int, default=4, help="流水线模式下搜索阶段并发数")
+    parser.add_argument("--download_concurrency", type=int, default=4, help="流水线模式下下载阶段并发数")
+    parser.add_argument("--queue_size", type=int, default=None, help="流水线阶段间队列容量")
+    parser.add_argument("--proxy_api", type=str, default="http://localhost:8000", help="代理池 API 地址")
+    parser.add_argument("--fetch_mode", type=str, default="thumb", choices=["thumb", "original", "best"],
+                        help="下载模式: thumb 缩略图, original 原图, best 不超过 max_pixels 的原图")
+    parser.add_argument("--max_pixels", type=int, default=None, help="best 模式下原图允许的最大像素数")
+    parser.add_argument("--upload_max_edge", type=int, default=None,
+                        help="上传前把种子图片长边缩小到该像素数并重新编码为 JPEG，默认上传原图")
+    parser.add_argument("--upload_quality", type=int, default=85, help="上传图片重新编码的 JPEG 质量")
+    parser.add_argument("--search_cache", type=str, default=DEFAULT_SEARCH_CACHE,
+                        help="持久化搜索缓存路径，与搜索服务共用；传空字符串时不使用缓存")
     
     args = parser.parse_args()
     
@@ -120,7 +378,25 @@ if __name__ == "__main__":
         exit(1)
     
     # 运行循环搜索
-    asyncio.run(search_and_download(args.image, args.save_dir))
+    if args.pipeline:
+        asyncio.run(search_and_download_pipeline(
+            args.image, args.save_dir, args.start_image,
+            search_concurrency=args.search_concurrency,
+            download_concurrency=args.download_concurrency,
+            queue_size=args.queue_size,
+            state_db=args.state_db,
+            proxy_api=args.proxy_api,
+            fetch_mode=args.fetch_mode,
+            max_pixels=args.max_pixels,
+            upload_max_edge=args.upload_max_edge,
+            upload_quality=args.upload_quality,
+            search_cache=args.search_cache,
+        ))
+    else:
+        asyncio.run(search_and_download(args.image, args.save_dir, args.start_image, state_db=args.state_db,
+                                        proxy_api=args.proxy_api, fetch_mode=args.fetch_mode,
+                                        max_pixels=args.max_pixels, upload_max_edge=args.upload_max_edge,
+                                        upload_quality=args.upload_quality, search_cache=args.search_cache))
 
     
 
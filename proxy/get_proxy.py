@@ -1,13 +1,14 @@
 import requests
 import random
 import json
-import re
+
+from harvester import DEFAULT_SOURCES, parse_proxies
 
 class ProxyManager:
     """代理管理类"""
     
     def __init__(self):
-        self.proxy_api_url = "https://github.com/MrMarble/proxy-list/raw/refs/heads/main/all.txt"
+        self.proxy_api_url = DEFAULT_SOURCES[0]
         self.proxies = self.get_proxies()
 
     def get_proxies(self):
@@ -15,23 +16,8 @@ class ProxyManager:
         try:
             # 获取代理列表
             response = requests.get(self.proxy_api_url)
-            proxy_list = []
-            
-            # 解析每行JSON数据
-            for line in response.text.split('\n'):
-                if line:
-                    try:
-                        # 使用正则表达式匹配IP地址和端口格式
-                        pattern = r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(\d+)'
-                        match = re.match(pattern, line)
-                        if match:
-                            ip, port = match.groups()
-                            proxy = f"http://{ip}:{port}"
-                            proxy_list.append(proxy)
-                    except:
-                        continue
-            
-            return proxy_list
+            # 使用预编译的正则一次解析整段文本
+            return parse_proxies(response.text)
         except:
             return []
     
@@ -59,9 +45,10 @@ class ProxyManager:
             
         try:
             # 设置代理格式
+            # https 目标需要通过代理的 CONNECT 隧道，两个键都要设置
             proxies = {
                 'http': proxy,
-                # 'https': proxy
+                'https': proxy
             }
             # 尝试访问百度
             response = requests.get('https://www.baidu.com', proxies=proxies, timeout=timeout)
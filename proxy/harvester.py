@@ -0,0 +1,118 @@
+import os
+import re
+import asyncio
+import aiohttp
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 默认代理源，可在构造 ProxyHarvester 时传入多个 URL 或本地文件路径
+DEFAULT_SOURCES = (
+    "https://github.com/MrMarble/proxy-list/raw/refs/heads/main/all.txt",
+)
+
+# 每行开头的 ip:port，整段文本一次匹配，不必逐行编译/匹配
+PROXY_PATTERN = re.compile(r'^\s*(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(\d{1,5})', re.MULTILINE)
+
+
+def parse_proxies(text):
+    """
+    从代理列表文本中解析代理地址
+
+    Args:
+        text (str): 每行一个 ip:port 的文本
+
+    Returns:
+        list: http://ip:port 格式的代理列表，保持原有顺序并去重
+    """
+    return list(dict.fromkeys(f"http://{ip}:{port}" for ip, port in PROXY_PATTERN.findall(text)))
+
+
+class ProxyHarvester:
+    """
+    多源异步代理采集器
+
+    并发拉取所有代理源，HTTP 源使用 ETag/If-Modified-Since 条件请求，
+    本地文件源按 (修改时间, 大小) 判断是否变化；列表未变化时不再下载和解析。
+    每次只返回此前从未采集到的代理，列表没有更新时刷新几乎没有开销。
+    """
+
+    def __init__(self, sources=DEFAULT_SOURCES, timeout=10):
+        """
+        Args:
+            sources (iterable): 代理源，http(s) URL 或本地文件路径
+            timeout (float): 单个 HTTP 源的请求超时(秒)
+        """
+        self.sources = list(sources)
+        self.timeout = timeout
+        self.seen = set()  # 已采集过的全部代理
+        self._validators = {}  # 代理源 -> ETag/Last-Modified 或 文件(修改时间, 大小)
+        self.stats = {"fetched": 0, "not_modified": 0, "errors": 0}
+
+    async def harvest(self, session=None):
+        """
+        拉取全部代理源
+
+        Args:
+            session (aiohttp.ClientSession, optional): 复用的会话，为None时临时创建
+
+        Returns:
+            list: 本次新出现的代理地址
+        """
+        if session is None:
+            async with aiohttp.ClientSession() as own_session:
+                return await self.harvest(own_session)
+
+        results = await asyncio.gather(*(self._fetch(session, source) for source in self.sources))
+        new_proxies = []
+        for source, text in zip(self.sources, results):
+            if text is None:
+                continue
+            for proxy in parse_proxies(text):
+                if proxy not in self.seen:
+                    self.seen.add(proxy)
+                    new_proxies.append(proxy)
+        return new_proxies
+
+    async def _fetch(self, session, source):
+        """拉取单个代理源，未变化或出错时返回None"""
+        try:
+            if source.startswith(("http://", "https://")):
+                return await self._fetch_url(session, source)
+            return await asyncio.to_thread(self._read_file, source)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"拉取代理源失败 {source}: {str(e)}")
+            return None
+
+    async def _fetch_url(self, session, url):
+        headers = {}
+        etag, last_modified = self._validators.get(url, (None, None))
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with session.get(url, headers=headers, timeout=timeout) as response:
+            if response.status == 304:
+                self.stats["not_modified"] += 1
+                logger.debug(f"代理源未变化: {url}")
+                return None
+            response.raise_for_status()
+            text = await response.text()
+            self._validators[url] = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        self.stats["fetched"] += 1
+        return text
+
+    def _read_file(self, path):
+        st = os.stat(path)
+        validator = (st.st_mtime_ns, st.st_size)
+        if self._validators.get(path) == validator:
+            self.stats["not_modified"] += 1
+            return None
+        with open(path, "r") as f:
+            text = f.read()
+        self._validators[path] = validator
+        self.stats["fetched"] += 1
+        return text
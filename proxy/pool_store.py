@@ -0,0 +1,193 @@
+import os
+import json
+import asyncio
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+class PoolPersister:
+    """
+    代理池的延迟写 (write-behind) 持久化
+
+    代理池的每次变更只在内存中标记，由后台任务按固定间隔合并写盘，关闭时再写一次。
+    快照通过 临时文件 + 重命名 原子替换；可选的追加日志 (journal) 只写入两次快照之间的增量，
+    崩溃后通过 快照 + 日志重放 恢复，日志累积到一定条数时再压缩为新的快照。
+    """
+
+    def __init__(self, path, snapshot_func, get_info=None, flush_interval=5.0, journal=False,
+                 compact_every=1000):
+        """
+        Args:
+            path (str): 快照文件路径
+            snapshot_func (callable): 返回完整快照数据的函数
+            get_info (callable): get_info(proxy) 返回代理当前信息，启用日志时用于追加 upsert 增量
+            flush_interval (float): 写盘间隔(秒)
+            journal (bool): 是否启用追加日志，日志文件为 path + ".journal"
+            compact_every (int): 日志累积多少条后压缩为快照
+        """
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.snapshot_func = snapshot_func
+        self.get_info = get_info
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self.compact_every = compact_every
+        self._dirty = False
+        self._pending = {}  # 代理地址 -> 最近一次变更，同一代理的多次变更合并为一条
+        self._journal_entries = 0
+        self._writing = None  # 线程中正在进行的写入
+        self.flush_count = 0
+
+    def upsert(self, proxy):
+        """标记代理被新增或更新"""
+        self._dirty = True
+        self._pending[proxy] = ("upsert", None)
+
+    def remove(self, proxy, used=False):
+        """标记代理被移出可用池，used 表示移入待重测集合"""
+        self._dirty = True
+        self._pending[proxy] = ("remove", used)
+
+    def mark_dirty(self):
+        """标记需要写入完整快照 (如批量变更)"""
+        self._dirty = True
+        self._pending.clear()
+        self._journal_entries = self.compact_every
+
+    def load(self):
+        """
+        读取快照并重放日志
+
+        Returns:
+            dict: {'used_proxies': [...], 'available_proxies': [...]}，文件不存在时返回None
+        """
+        data = None
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        if not os.path.exists(self.journal_path):
+            return data
+
+        data = data or {'used_proxies': [], 'available_proxies': []}
+        available = {info['proxy']: info for info in data.get('available_proxies', [])}
+        used = set(data.get('used_proxies', []))
+        replayed = 0
+        with open(self.journal_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 崩溃时可能留下不完整的最后一行
+                    break
+                if entry['op'] == 'upsert':
+                    available[entry['proxy']] = entry['info']
+                    used.discard(entry['proxy'])
+                else:
+                    available.pop(entry['proxy'], None)
+                    if entry.get('used'):
+                        used.add(entry['proxy'])
+                replayed += 1
+        self._journal_entries = replayed
+        logger.info(f"从日志重放了 {replayed} 条代理池变更")
+        return {'used_proxies': list(used), 'available_proxies': list(available.values())}
+
+    def flush(self):
+        """立即写盘：启用日志且未到压缩阈值时只追加增量，否则原子写入完整快照"""
+        prepared = self._prepare()
+        if prepared is not None:
+            self._write(*prepared)
+
+    async def flush_async(self):
+        """与 flush 相同，但在事件循环中只做序列化，文件写入放到线程中执行"""
+        prepared = self._prepare()
+        if prepared is not None:
+            # 线程中的写入不能被中途取消，保存引用以便取消时等待其完成
+            self._writing = asyncio.ensure_future(asyncio.to_thread(self._write, *prepared))
+            try:
+                await asyncio.shield(self._writing)
+            except Exception:
+                # 已取出的增量没有写入，下次写入完整快照
+                self._writing = None
+                self.mark_dirty()
+                raise
+            self._writing = None
+
+    async def _wait_writing(self):
+        """等待线程中正在进行的写入结束，写入失败时下次写入完整快照"""
+        writing, self._writing = self._writing, None
+        if writing is None:
+            return
+        await asyncio.wait([writing])
+        if not writing.cancelled() and writing.exception() is not None:
+            logger.error(f"代理池写盘出错: {str(writing.exception())}")
+            self.mark_dirty()
+
+    def _prepare(self):
+        """在调用方线程中序列化待写入的数据，返回 (类型, 文本) 或 None"""
+        if not self._dirty:
+            return None
+        if self.journal and self.get_info is not None and self._journal_entries < self.compact_every:
+            lines = []
+            for proxy, (op, used) in self._pending.items():
+                if op == 'upsert':
+                    info = self.get_info(proxy)
+                    if info is None:
+                        continue
+                    lines.append(json.dumps({'op': 'upsert', 'proxy': proxy, 'info': info}))
+                else:
+                    lines.append(json.dumps({'op': 'remove', 'proxy': proxy, 'used': used}))
+            self._journal_entries += len(lines)
+            prepared = ('journal', '\n'.join(lines) + '\n') if lines else None
+        else:
+            prepared = ('snapshot', json.dumps(self.snapshot_func()))
+            self._journal_entries = 0
+        self._pending.clear()
+        self._dirty = False
+        self.flush_count += 1
+        return prepared
+
+    def _write(self, kind, text):
+        if kind == 'journal':
+            with open(self.journal_path, 'a') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            self._write_snapshot(text)
+
+    def _write_snapshot(self, text):
+        """临时文件 + 重命名，保证快照文件始终完整"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        # 快照已包含全部状态，旧日志作废
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        logger.debug(f"代理池快照已写入: {self.path}")
+
+    async def run(self):
+        """后台任务：按间隔合并写盘，直到被取消"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    await self.flush_async()
+                except Exception as e:
+                    logger.error(f"代理池写盘出错: {str(e)}")
+        finally:
+            # 取消 (服务关闭) 时先等线程中的写入完成，再写入最后一次变更，避免两次写入交错
+            await self._wait_writing()
+            self.flush()
@@ -1,6 +1,7 @@
+import time
 import asyncio
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
@@ -18,6 +19,7 @@ logging.basicConfig(
 # 创建代理池实例
 proxy_pool = ProxyPool(expire_minutes=1)  # 设置代理过期时间为60分钟
 background_task = None
+persist_task = None
 
 # 后台任务：定期刷新代理池
 async def refresh_proxy_pool_task():
@@ -27,8 +29,8 @@ async def refresh_proxy_pool_task():
             await proxy_pool.refresh_pool_async(min_size=20, max_size=100, concurrency=10)
             await proxy_pool.retest_used_proxies_async()
             logger.info(f"代理池刷新完成，当前可用代理数量: {len(proxy_pool.available_proxies)}")
-            # 每1分钟刷新一次
-            await asyncio.sleep(60)
+            # 每1分钟刷新一次，代理不足时会被提前唤醒
+            await proxy_pool.wait_refresh_request(timeout=60)
         except Exception as e:
             logger.error(f"刷新代理池出错: {str(e)}")
             await asyncio.sleep(10)  # 出错后等待1分钟再试
@@ -38,8 +40,10 @@ async def refresh_proxy_pool_task():
 async def lifespan(app: FastAPI):
     # 启动时执行
     logger.info("服务启动，初始化代理池")
-    global background_task
+    global background_task, persist_task
     background_task = asyncio.create_task(refresh_proxy_pool_task())
+    # 代理池变更由后台任务按间隔合并写盘
+    persist_task = asyncio.create_task(proxy_pool.persister.run())
     
     yield  # 这里是应用运行的地方
     
@@ -51,6 +55,13 @@ async def lifespan(app: FastAPI):
             await background_task
         except asyncio.CancelledError:
             logger.info("后台任务已取消")
+    if persist_task:
+        # 取消时会写入最后一次变更
+        persist_task.cancel()
+        try:
+            await persist_task
+        except asyncio.CancelledError:
+            logger.info("代理池已写盘")
             # 创建FastAPI应用
             
 app = FastAPI(
@@ -70,12 +81,31 @@ class ProxyListResponse(BaseModel):
     message: str
     data: Optional[List[Dict[str, Any]]] = None
 
+class ProxyReportRequest(BaseModel):
+    proxy: str
+    success: bool
+    latency: Optional[float] = None  # 本次请求耗时(秒)
+
+class LeaseRequest(BaseModel):
+    capability: Optional[str] = None  # upload / download / http / https
+    ttl: float = 60  # 租约有效期(秒)
+    max_concurrency: int = 4  # 客户端通过该代理的最大并发数
+
+class LeaseRenewRequest(BaseModel):
+    ttl: Optional[float] = None  # 为空时沿用租约原有效期
+
+class LeaseReleaseRequest(BaseModel):
+    success: Optional[bool] = None  # 为空时只归还，不计入代理评分
+    latency: Optional[float] = None  # 平均请求耗时(秒)
+
 
 
 # 获取一个代理
 @app.get("/proxy", response_model=ProxyResponse, summary="获取一个可用代理")
-async def get_proxy():
-    proxy = proxy_pool.get_proxy()
+async def get_proxy(capability: Optional[str] = None):
+    # 只从内存队列中取出已验证的代理，请求路径上没有网络 I/O
+    # capability 可选 upload(以图搜图上传)、download(图片CDN)、http、https
+    proxy = await proxy_pool.get_proxy_async(capability)
     if proxy:
         return ProxyResponse(
             success=True,
@@ -89,6 +119,36 @@ async def get_proxy():
             data=None
         )
 
+# 反馈代理使用结果
+@app.post("/report", response_model=ProxyResponse, summary="反馈代理使用结果")
+async def report_proxy(request: ProxyReportRequest):
+    if proxy_pool.report(request.proxy, request.success, request.latency):
+        return ProxyResponse(success=True, message="反馈已记录")
+    return ProxyResponse(success=False, message="代理不在池中")
+
+# 租用代理
+@app.post("/lease", response_model=ProxyResponse, summary="租用一个代理")
+async def lease_proxy(request: LeaseRequest):
+    lease = proxy_pool.lease(request.capability, request.ttl, request.max_concurrency)
+    if lease is None:
+        return ProxyResponse(success=False, message="没有可用代理")
+    return ProxyResponse(success=True, message="租用代理成功", data=lease.to_dict())
+
+# 续租
+@app.post("/lease/{lease_id}/renew", response_model=ProxyResponse, summary="续租代理")
+async def renew_lease(lease_id: str, request: LeaseRenewRequest):
+    lease = proxy_pool.renew_lease(lease_id, request.ttl)
+    if lease is None:
+        return ProxyResponse(success=False, message="租约不存在或已过期")
+    return ProxyResponse(success=True, message="续租成功", data=lease.to_dict())
+
+# 归还租约并反馈结果
+@app.post("/lease/{lease_id}/release", response_model=ProxyResponse, summary="归还租用的代理")
+async def release_lease(lease_id: str, request: LeaseReleaseRequest):
+    if proxy_pool.release_lease(lease_id, request.success, request.latency):
+        return ProxyResponse(success=True, message="租约已归还")
+    return ProxyResponse(success=False, message="租约不存在或已过期")
+
 # 获取代理池状态
 @app.get("/status", response_model=ProxyResponse, summary="获取代理池状态")
 async def get_status():
@@ -98,6 +158,9 @@ async def get_status():
         data={
             "available_count": len(proxy_pool.available_proxies),
             "used_count": len(proxy_pool.used_proxies),
+            "quarantined_count": proxy_pool.quarantined_count,
+            "lease_count": len(proxy_pool.leases),
+            "capability_counts": proxy_pool.capability_counts,
             "expire_minutes": proxy_pool.expire_minutes
         }
     )
@@ -107,10 +170,14 @@ async def get_status():
 async def get_all_proxies():
     proxies = [
         {
-            "proxy": p["proxy"],
-            "added_time": p["added_time"],
-            "test_result": p["test_result"]
-        } for p in proxy_pool.available_proxies
+            "proxy": p.proxy,
+            "added_time": p.added_time,
+            "test_result": p.test_result,
+            "latency": p.latency,
+            "success_rate": p.success_rate,
+            "capabilities": sorted(p.capabilities),
+            "quarantined": p.quarantined_until > time.time()
+        } for p in proxy_pool.available_proxies.values()
     ]
     return ProxyListResponse(
         success=True,
@@ -120,7 +187,7 @@ async def get_all_proxies():
 
 # 手动刷新代理池
 @app.post("/refresh", response_model=ProxyResponse, summary="手动刷新代理池")
-async def refresh_pool(background_tasks: BackgroundTasks):
+async def refresh_pool():
     if len(proxy_pool.available_proxies) >= 20:
         return ProxyResponse(
             success=True,
@@ -128,8 +195,8 @@ async def refresh_pool(background_tasks: BackgroundTasks):
             data={"available_count": len(proxy_pool.available_proxies)}
         )
     
-    # 在后台刷新代理池
-    background_tasks.add_task(proxy_pool.refresh_pool, min_size=20, max_size=100)
+    # 唤醒后台刷新任务
+    proxy_pool.request_refresh()
     
     return ProxyResponse(
         success=True,
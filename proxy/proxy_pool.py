@@ -1,13 +1,18 @@
 import os
 import json
 import time
+import uuid
+import heapq
+import random
 import asyncio
 import aiohttp
 import logging
 import requests
 
+from collections import OrderedDict
 from datetime import datetime
-from get_proxy import ProxyManager
+from harvester import DEFAULT_SOURCES, ProxyHarvester
+from pool_store import PoolPersister
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -16,79 +21,273 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+# 按目标划分的探测配置：名称即通过后获得的能力标签
+#   url: 探测地址；https 地址走 CONNECT 隧道，http 地址由代理直接转发
+#   content_type: 响应 Content-Type 需要满足的前缀，用于识别返回劫持页面的代理
+PROBE_PROFILES = {
+    'http': {'url': 'http://www.baidu.com', 'content_type': None},
+    'https': {'url': 'https://www.baidu.com', 'content_type': None},
+    # 以图搜图上传所在的主机
+    'upload': {'url': 'https://graph.baidu.com/pcpage/index?tpl_from=pc', 'content_type': None},
+    # 相似图片缩略图所在的 CDN
+    'download': {
+        'url': 'https://mms1.baidu.com/it/u=3609773648,115186739&fm=253&app=138&f=JPEG?w=690&h=148',
+        'content_type': 'image/',
+    },
+}
+
+# 准入条件：必须通过 https 探测 (与原先只接受能访问 https://www.baidu.com 的代理一致)。
+# 只通过 http 探测的代理无法建立 CONNECT 隧道，不能进入默认选择堆
+ADMISSION_CAPABILITY = 'https'
+
+
+class ProxyRecord:
+    """单个代理的记录，使用 __slots__ 减少大量代理时的内存占用"""
+
+    __slots__ = (
+        'proxy', 'timestamp', 'added_time', 'test_result', 'latency', 'success_rate',
+        'failures', 'inflight', 'quarantined_until', 'capabilities', 'version', 'expiry_deadline',
+    )
+
+    # 需要持久化的字段，inflight、version、expiry_deadline 为运行期状态
+    PERSISTED_FIELDS = (
+        'proxy', 'timestamp', 'added_time', 'test_result', 'latency', 'success_rate',
+        'failures', 'quarantined_until', 'capabilities',
+    )
+
+    def __init__(self, proxy, timestamp=None, added_time=None, test_result=None, latency=None,
+                 success_rate=1.0, failures=0, quarantined_until=0, capabilities=()):
+        self.proxy = proxy
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.added_time = added_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.test_result = test_result
+        self.latency = 5.0 if latency is None else latency  # 未知延迟按较慢处理
+        self.success_rate = success_rate
+        self.failures = failures
+        self.inflight = 0
+        self.quarantined_until = quarantined_until
+        self.capabilities = frozenset(capabilities)  # 通过的探测配置名称
+        self.version = 0
+        self.expiry_deadline = None  # 过期堆中有效条目的时间，其余条目视为失效
+
+    @classmethod
+    def from_dict(cls, data):
+        """从持久化的字典恢复记录，忽略未知字段"""
+        return cls(**{k: data[k] for k in cls.PERSISTED_FIELDS if k in data})
+
+    def to_dict(self):
+        """转换为可持久化的字典"""
+        data = {k: getattr(self, k) for k in self.PERSISTED_FIELDS}
+        data['capabilities'] = sorted(self.capabilities)
+        return data
+
+
+class ProxyLease:
+    """代理租约：在有效期内由一个客户端独占使用 max_concurrency 个并发名额"""
+
+    __slots__ = ('lease_id', 'proxy', 'capability', 'max_concurrency', 'ttl', 'expires_at')
+
+    def __init__(self, proxy, capability, max_concurrency, ttl):
+        self.lease_id = uuid.uuid4().hex
+        self.proxy = proxy
+        self.capability = capability
+        self.max_concurrency = max_concurrency
+        self.ttl = ttl
+        self.expires_at = time.time() + ttl
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
 class ProxyPool:
     """代理池管理类，用于存储和管理可用代理"""
     
-    def __init__(self, pool_file="../static/proxy_pool.json", expire_minutes=1):
+    def __init__(self, pool_file="../static/proxy_pool.json", expire_minutes=1, low_watermark=5,
+                 ewma_alpha=0.3, breaker_threshold=3, quarantine_seconds=300,
+                 persist_interval=5.0, journal=False, sources=DEFAULT_SOURCES, max_inflight_per_proxy=16,
+                 spread_top_k=4):
         """
         初始化代理池
         
         Args:
             pool_file (str): 代理池存储文件路径
-            expire_minutes (int): 代理过期时间(分钟)
+            expire_minutes (int): 代理过期时间(分钟)，成功的使用反馈会刷新计时
+            low_watermark (int): 可用代理少于该数量时通知后台任务刷新
+            ewma_alpha (float): 延迟与成功率指数加权平均的平滑系数
+            breaker_threshold (int): 连续失败多少次后熔断隔离该代理
+            quarantine_seconds (int): 熔断隔离时长(秒)，到期后半开放行
+            persist_interval (float): 延迟写盘的间隔(秒)，需运行 persister.run() 后台任务
+            journal (bool): 是否使用追加日志只写增量
+            sources (iterable): 代理源，http(s) URL 或本地文件路径
+            max_inflight_per_proxy (int): 单个代理同时被使用的最大并发数 (含租约占用的名额)
+            spread_top_k (int): 普通取用在得分最优的前 k 个代理中按 1/得分 加权随机选择，
+                避免不占名额的取用全部落到同一个代理上
         """
         self.pool_file = pool_file
         self.expire_minutes = expire_minutes
-        self.proxy_manager = ProxyManager()
-        self.used_proxies = set()  # 已使用过的代理集合
-        self.available_proxies = []  # 可用代理列表
+        self.low_watermark = low_watermark
+        self.ewma_alpha = ewma_alpha
+        self.breaker_threshold = breaker_threshold
+        self.quarantine_seconds = quarantine_seconds
+        self.max_inflight_per_proxy = max_inflight_per_proxy
+        self.spread_top_k = max(int(spread_top_k), 1)
+        self.harvester = ProxyHarvester(sources)
+        self.candidates = OrderedDict()  # 已采集、尚未测试的代理 (有序字典当作有序集合)
+        self.used_proxies = set()  # 已过期、等待重新测试的代理集合
+        self.available_proxies = {}  # 可用代理: 地址 -> ProxyRecord
+        # 选择堆: (得分, 版本号, 地址)，得分越低越优先；键为能力标签，None 对应全部代理
+        self._heaps = {None: []}
+        self._expiry = []  # 过期堆: (过期时间, 地址)，记录续期后惰性更新
+        self._quarantine = []  # 熔断隔离堆: (解除时间, 地址)
+        self.leases = {}  # 租约ID -> ProxyLease
+        self._lease_expiry = []  # 租约过期堆: (过期时间, 租约ID)，续期后旧条目惰性失效
+        # 最近过期的租约: 租约ID -> 代理地址，过期后才归还的租约仍能把使用结果计入评分
+        self._expired_leases = OrderedDict()
+        self.expired_lease_memory = 1024
+        self.refresh_event = asyncio.Event()  # 通知后台任务尽快刷新
+        self.persister = PoolPersister(
+            pool_file, self._snapshot, get_info=self._persisted_info,
+            flush_interval=persist_interval, journal=journal,
+        )
         self.load_pool()
     
     def load_pool(self):
-        """从文件加载代理池"""
-        if os.path.exists(self.pool_file):
-            try:
-                with open(self.pool_file, 'r') as f:
-                    data = json.load(f)
-                    
-                    # 加载已使用的代理
-                    self.used_proxies = set(data.get('used_proxies', []))
-                    
-                    # 加载并过滤过期的可用代理
-                    current_time = time.time()
-                    self.available_proxies = []
-                    
-                    for proxy_info in data.get('available_proxies', []):
-                        # 检查代理是否过期
-                        if current_time - proxy_info['timestamp'] < self.expire_minutes * 60:
-                            self.available_proxies.append(proxy_info)
-                logger.info(f"从文件加载了 {len(self.available_proxies)} 个可用代理和 {len(self.used_proxies)} 个已使用代理")
-            except Exception as e:
-                logger.error(f"加载代理池文件出错: {str(e)}")
-                self.available_proxies = []
+        """从文件加载代理池 (快照 + 日志重放)"""
+        try:
+            data = self.persister.load()
+        except Exception as e:
+            logger.error(f"加载代理池文件出错: {str(e)}")
+            data = None
+        if data is None:
+            return
+        # 加载已使用的代理
+        self.used_proxies = set(data.get('used_proxies', []))
+        
+        # 加载并过滤过期的可用代理
+        current_time = time.time()
+        self.available_proxies = {}
+        self._heaps = {None: []}
+        self._expiry = []
+        self._quarantine = []
+        
+        for proxy_info in data.get('available_proxies', []):
+            # 检查代理是否过期
+            if current_time - proxy_info['timestamp'] < self.expire_minutes * 60:
+                record = ProxyRecord.from_dict(proxy_info)
+                # 旧版本保存的记录没有能力标签，当时只接受通过 https 检测的代理
+                if record.capabilities and ADMISSION_CAPABILITY not in record.capabilities:
+                    continue
+                self._track(record)
+        logger.info(f"从文件加载了 {len(self.available_proxies)} 个可用代理和 {len(self.used_proxies)} 个已使用代理")
     
     def save_pool(self):
-        """保存代理池到文件"""
-        data = {
-            'used_proxies': list(self.used_proxies),
-            'available_proxies': self.available_proxies
-        }
-        
+        """立即原子写入完整快照 (通常由 persister 后台任务按间隔合并写盘)"""
         try:
-            with open(self.pool_file, 'w') as f:
-                json.dump(data, f)
+            self.persister.mark_dirty()
+            self.persister.flush()
             logger.debug(f"代理池已保存到文件: {self.pool_file}")
         except Exception as e:
             logger.error(f"保存代理池文件出错: {str(e)}")
+
+    def _persisted_info(self, proxy):
+        """需要持久化的代理信息 (不含版本号、在用数等运行期字段)"""
+        record = self.available_proxies.get(proxy)
+        return record.to_dict() if record is not None else None
+
+    def _snapshot(self):
+        return {
+            'used_proxies': list(self.used_proxies),
+            'available_proxies': [self._persisted_info(proxy) for proxy in self.available_proxies]
+        }
     
-    def add_proxy(self, proxy, test_result=None):
+    def add_proxy(self, proxy, test_result=None, latency=None, capabilities=()):
         """
         添加一个可用代理到池中
         
         Args:
             proxy (str): 代理地址
             test_result (str, optional): 测试结果信息
+            latency (float, optional): 测试时测得的响应时间(秒)，作为初始延迟评分
+            capabilities (iterable, optional): 代理通过的探测配置名称，见 PROBE_PROFILES
         """
-        if proxy not in self.used_proxies and not any(p['proxy'] == proxy for p in self.available_proxies):
-            proxy_info = {
-                'proxy': proxy,
-                'timestamp': time.time(),
-                'added_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'test_result': test_result
-            }
-            self.available_proxies.append(proxy_info)
+        if proxy not in self.used_proxies and proxy not in self.available_proxies:
+            self._track(ProxyRecord(proxy, test_result=test_result, latency=latency,
+                                    capabilities=capabilities))
             logger.info(f"添加新代理到池中: {proxy}, 测试结果: {test_result}")
-            self.save_pool()
+            self.persister.upsert(proxy)
+
+    def _track(self, record):
+        """登记到可用代理表，并放入选择堆和过期堆"""
+        self.available_proxies[record.proxy] = record
+        self._push_expiry(record)
+        if record.quarantined_until > time.time():
+            heapq.heappush(self._quarantine, (record.quarantined_until, record.proxy))
+        else:
+            self._push(record)
+
+    def _score(self, record):
+        """延迟越低、成功率越高、在用数越少，得分越低"""
+        return record.latency / max(record.success_rate, 0.05) * (1 + record.inflight)
+
+    def _push(self, record):
+        """以最新得分重新入堆，旧的堆条目通过版本号失效"""
+        record.version += 1
+        entry = (self._score(record), record.version, record.proxy)
+        for capability in (None, *record.capabilities):
+            heap = self._heaps.setdefault(capability, [])
+            heapq.heappush(heap, entry)
+            if len(heap) > 4 * len(self.available_proxies) + 64:
+                self._rebuild_heap(capability)
+
+    def _rebuild_heap(self, capability):
+        """失效条目过多时按当前记录重建堆，避免不被取用的堆 (如 None、http) 无限增长"""
+        now = time.time()
+        heap = [
+            (self._score(record), record.version, record.proxy)
+            for record in self.available_proxies.values()
+            if record.quarantined_until <= now and (capability is None or capability in record.capabilities)
+        ]
+        heapq.heapify(heap)
+        self._heaps[capability] = heap
+
+    def _push_expiry(self, record):
+        record.expiry_deadline = record.timestamp + self.expire_minutes * 60
+        heapq.heappush(self._expiry, (record.expiry_deadline, record.proxy))
+
+    def _expire(self, proxy):
+        """将代理从可用池移入待重测集合，各个堆中的旧条目在取出时跳过"""
+        del self.available_proxies[proxy]
+        self.used_proxies.add(proxy)
+        self.persister.remove(proxy, used=True)
+
+    def _release_quarantine(self, now):
+        """将隔离到期的代理放回选择堆 (半开状态：再失败一次即重新隔离)"""
+        while self._quarantine and self._quarantine[0][0] <= now:
+            _, proxy = heapq.heappop(self._quarantine)
+            record = self.available_proxies.get(proxy)
+            if record is not None and record.quarantined_until <= now:
+                record.failures = self.breaker_threshold - 1
+                self._push(record)
+
+    @property
+    def quarantined_count(self):
+        """当前处于熔断隔离中的代理数 (只遍历隔离堆)"""
+        now = time.time()
+        count = 0
+        for until, proxy in self._quarantine:
+            record = self.available_proxies.get(proxy)
+            if until > now and record is not None and record.quarantined_until == until:
+                count += 1
+        return count
+
+    @property
+    def capability_counts(self):
+        """各能力标签对应的可用代理数"""
+        counts = {name: 0 for name in PROBE_PROFILES}
+        for record in self.available_proxies.values():
+            for capability in record.capabilities:
+                counts[capability] = counts.get(capability, 0) + 1
+        return counts
 
     def test_proxy(self, proxy, timeout=2):
         """
@@ -107,81 +306,330 @@ class ProxyPool:
                 'https': proxy
             }
             start_time = time.time()
-            response = requests.get('https://mms1.baidu.com/it/u=3609773648,115186739&fm=253&app=138&f=JPEG?w=690&h=148', proxy=proxies, timeout=timeout)
-            if response.status == 200:
+            response = requests.get(PROBE_PROFILES['download']['url'], proxies=proxies, timeout=timeout)
+            if response.status_code == 200:
                 elapsed = time.time() - start_time
                 logger.debug(f"代理测试成功: {proxy}, 响应时间: {elapsed:.2f}秒")
-                return True, proxy, f"状态码: {response.status}, 响应时间: {elapsed:.2f}秒"
+                return True, proxy, f"状态码: {response.status_code}, 响应时间: {elapsed:.2f}秒"
             else:
-                logger.debug(f"代理测试失败: {proxy}, 状态码: {response.status}")
-                return False, proxy, f"状态码: {response.status}"
+                logger.debug(f"代理测试失败: {proxy}, 状态码: {response.status_code}")
+                return False, proxy, f"状态码: {response.status_code}"
         except Exception as e:
             logger.debug(f"代理测试异常: {proxy}, 错误: {str(e)}")
             return False, proxy, str(e)
 
     
-    def get_proxy(self):
+    def get_proxy(self, capability=None, weight=0):
         """
-        获取一个可用代理，并将其标记为已使用
+        获取当前评分最优的健康代理
+        
+        只在内存中从选择堆取出代理，不做任何网络请求；代理不会在使用一次后作废，
+        而是由调用方通过 report() 反馈结果来更新评分。
+        普通取用 (weight=0) 不改变得分，因此在前 spread_top_k 个代理中按 1/得分 加权随机选择
+        
+        Args:
+            capability (str, optional): 需要的能力标签，如 'upload'、'download'，为None时不限
+            weight (int): 占用的并发名额，超过 max_inflight_per_proxy 的代理会被跳过；
+                普通取用为0，不占名额，避免取用后不反馈的调用方把代理永久占满，只有租约占用名额
         
         Returns:
             str: 代理地址，如果没有可用代理则返回None
         """
-        if not self.available_proxies:
-            logger.info("代理池为空，尝试刷新代理池")
-            self.refresh_pool()
-            
-        while self.available_proxies:
-            proxy_info = self.available_proxies.pop(0)
-            proxy = proxy_info['proxy']
-            success, _, message = self.proxy_manager.test_proxy(proxy)
-            if success:
-                self.used_proxies.add(proxy)
-                logger.info(f"获取代理: {proxy}")
-                self.save_pool()
-                return proxy
-            else:
-                logger.warning(f"代理测试失败: {proxy}, 错误: {message}")
+        now = time.time()
+        deadline = now - self.expire_minutes * 60
+        self._release_quarantine(now)
+        self._expire_leases(now)
+        heap = self._heaps.get(capability, [])
+        top_k = 1 if weight else self.spread_top_k
+        candidates = []  # 可选代理的堆条目，未被选中的取完后放回堆中
+        saturated = []  # 并发已满的代理，取完后放回堆中
+        while heap and len(candidates) < top_k:
+            entry = heapq.heappop(heap)
+            _, version, proxy = entry
+            record = self.available_proxies.get(proxy)
+            # 跳过已失效的堆条目
+            if record is None or record.version != version:
+                continue
+            if record.timestamp < deadline:
+                self._expire(proxy)
+                continue
+            if record.inflight + weight > self.max_inflight_per_proxy:
+                saturated.append(entry)
+                continue
+            candidates.append(entry)
+
+        found = None
+        if candidates:
+            chosen = random.choices(candidates, weights=[1 / max(entry[0], 1e-6) for entry in candidates])[0]
+            found = self.available_proxies[chosen[2]]
+            saturated.extend(entry for entry in candidates if entry is not chosen)
+        for entry in saturated:
+            heapq.heappush(heap, entry)
+
+        if found is not None:
+            found.inflight += weight
+            self._push(found)
+            logger.info(f"获取代理: {found.proxy}, 延迟评分: {found.latency:.2f}秒, 成功率: {found.success_rate:.2f}")
+            if len(self.available_proxies) < self.low_watermark:
+                self.request_refresh()
+            return found.proxy
             
-        logger.warning("没有可用代理")
+        logger.warning(f"没有可用代理 (能力: {capability})" if capability else "没有可用代理")
+        self.request_refresh()
         return None
+
+    def report(self, proxy, success, latency=None, release=0):
+        """
+        调用方反馈一次代理使用结果，更新延迟与成功率并执行熔断
+        
+        Args:
+            proxy (str): 代理地址
+            success (bool): 本次请求是否成功
+            latency (float, optional): 本次请求耗时(秒)
+            release (int): 归还的并发名额，只有归还租约时不为0
+        
+        Returns:
+            bool: 代理是否在池中
+        """
+        record = self.available_proxies.get(proxy)
+        if record is None:
+            return False
+        alpha = self.ewma_alpha
+        now = time.time()
+        record.inflight = max(record.inflight - release, 0)
+        record.success_rate = (1 - alpha) * record.success_rate + alpha * (1.0 if success else 0.0)
+        if latency is not None and success:
+            record.latency = (1 - alpha) * record.latency + alpha * latency
+        if success:
+            record.failures = 0
+            record.quarantined_until = 0
+            # 续期只更新时间戳，过期堆中的条目在到期取出时再按新时间重新入堆
+            record.timestamp = now
+            self._push(record)
+        else:
+            record.failures += 1
+            if record.failures >= self.breaker_threshold:
+                # 熔断：使堆中条目失效，隔离到期后再放回
+                record.quarantined_until = now + self.quarantine_seconds
+                record.version += 1
+                heapq.heappush(self._quarantine, (record.quarantined_until, proxy))
+                logger.warning(f"代理连续失败 {record.failures} 次，隔离 {self.quarantine_seconds} 秒: {proxy}")
+            else:
+                self._push(record)
+        self.persister.upsert(proxy)
+        return True
+
+    def lease(self, capability=None, ttl=60, max_concurrency=4):
+        """
+        租用一个代理：在有效期内占用 max_concurrency 个并发名额，到期未续租自动归还
+        
+        Args:
+            capability (str, optional): 需要的能力标签
+            ttl (float): 租约有效期(秒)
+            max_concurrency (int): 客户端通过该代理的最大并发请求数
+        
+        Returns:
+            ProxyLease: 租约，没有可用代理时返回None
+        """
+        max_concurrency = min(max(int(max_concurrency), 1), self.max_inflight_per_proxy)
+        proxy = self.get_proxy(capability, weight=max_concurrency)
+        if proxy is None:
+            return None
+        lease = ProxyLease(proxy, capability, max_concurrency, ttl)
+        self.leases[lease.lease_id] = lease
+        heapq.heappush(self._lease_expiry, (lease.expires_at, lease.lease_id))
+        return lease
+
+    def renew_lease(self, lease_id, ttl=None):
+        """
+        续租，返回更新后的租约；租约不存在或已过期时返回None
+        """
+        now = time.time()
+        self._expire_leases(now)
+        lease = self.leases.get(lease_id)
+        if lease is None:
+            return None
+        lease.expires_at = now + (ttl or lease.ttl)
+        heapq.heappush(self._lease_expiry, (lease.expires_at, lease_id))
+        return lease
+
+    def release_lease(self, lease_id, success=None, latency=None):
+        """
+        归还租约并反馈使用结果
+        
+        Args:
+            lease_id (str): 租约ID
+            success (bool, optional): 租约期间的整体结果，为None时只归还名额
+            latency (float, optional): 平均请求耗时(秒)
+        
+        Returns:
+            bool: 租约是否存在 (含最近已过期的租约)
+        """
+        lease = self.leases.pop(lease_id, None)
+        if lease is None:
+            # 已过期的租约名额已经归还，只把客户端汇总的结果计入评分
+            proxy = self._expired_leases.pop(lease_id, None)
+            if proxy is None:
+                return False
+            if success is not None:
+                self.report(proxy, success, latency)
+            return True
+        if success is None:
+            self._release_inflight(lease.proxy, lease.max_concurrency)
+        else:
+            self.report(lease.proxy, success, latency, release=lease.max_concurrency)
+        return True
+
+    def _expire_leases(self, now):
+        """回收已过期的租约，不计入成功率"""
+        while self._lease_expiry and self._lease_expiry[0][0] <= now:
+            expires_at, lease_id = heapq.heappop(self._lease_expiry)
+            lease = self.leases.get(lease_id)
+            if lease is None or lease.expires_at != expires_at:
+                continue
+            del self.leases[lease_id]
+            self._release_inflight(lease.proxy, lease.max_concurrency)
+            self._expired_leases[lease_id] = lease.proxy
+            while len(self._expired_leases) > self.expired_lease_memory:
+                self._expired_leases.popitem(last=False)
+            logger.info(f"租约过期: {lease_id}, 代理: {lease.proxy}")
+
+    def _release_inflight(self, proxy, count):
+        """归还并发名额，未处于隔离中的代理以新得分重新入堆"""
+        record = self.available_proxies.get(proxy)
+        if record is None:
+            return
+        record.inflight = max(record.inflight - count, 0)
+        if record.quarantined_until <= time.time():
+            self._push(record)
+
+    async def get_proxy_async(self, capability=None):
+        """
+        异步接口：获取一个可用代理，不阻塞事件循环
+        
+        Args:
+            capability (str, optional): 需要的能力标签
+        
+        Returns:
+            str: 代理地址，如果没有可用代理则返回None
+        """
+        return self.get_proxy(capability)
+
+    def request_refresh(self):
+        """通知后台刷新任务尽快补充代理"""
+        self.refresh_event.set()
+
+    async def wait_refresh_request(self, timeout):
+        """
+        等待刷新通知或超时，供后台刷新任务使用
+        
+        Args:
+            timeout (float): 最长等待秒数
+        """
+        try:
+            await asyncio.wait_for(self.refresh_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.refresh_event.clear()
     
-    async def test_proxy_async(self, proxy, timeout=5):
+    async def test_proxy_async(self, proxy, timeout=5, session=None, connect_timeout=2, profiles=None):
         """
-        异步测试代理是否可用
+        异步测试代理对各个目标是否可用，各探测配置并发执行
         
         Args:
             proxy (str): 代理地址
-            timeout (int): 超时时间(秒)
+            timeout (int): 单个探测的总超时时间(秒)
+            session (aiohttp.ClientSession, optional): 复用的会话，为None时临时创建
+            connect_timeout (float): 连接代理的超时时间(秒)，连不上的代理会提前失败
+            profiles (dict, optional): 探测配置，默认使用 PROBE_PROFILES
             
         Returns:
-            tuple: (是否可用, 代理地址, 错误信息)
+            tuple: (是否可用, 代理地址, 测试信息, 通过探测的平均响应时间或None, 能力标签集合)
+            未通过 https 探测 (ADMISSION_CAPABILITY) 的代理视为不可用
         """
+        if session is None:
+            async with aiohttp.ClientSession() as own_session:
+                return await self.test_proxy_async(proxy, timeout, own_session, connect_timeout, profiles)
+
+        profiles = profiles or PROBE_PROFILES
+        client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout)
+        results = await asyncio.gather(*(
+            self._probe(session, proxy, profile, client_timeout) for profile in profiles.values()
+        ))
+        capabilities = set()
+        elapsed_list = []
+        messages = []
+        for name, (ok, message, elapsed) in zip(profiles, results):
+            messages.append(f"{name}: {message}")
+            if ok:
+                capabilities.add(name)
+                elapsed_list.append(elapsed)
+        message = ", ".join(messages)
+        admitted = ADMISSION_CAPABILITY in capabilities if ADMISSION_CAPABILITY in profiles else bool(capabilities)
+        if not admitted:
+            logger.debug(f"代理测试失败: {proxy}, {message}")
+            return False, proxy, message, None, capabilities
+        elapsed = sum(elapsed_list) / len(elapsed_list)
+        logger.debug(f"代理测试成功: {proxy}, 能力: {sorted(capabilities)}, 平均响应时间: {elapsed:.2f}秒")
+        return True, proxy, message, elapsed, capabilities
+
+    async def _probe(self, session, proxy, profile, client_timeout):
+        """执行单个探测，返回 (是否通过, 信息, 响应时间)"""
         try:
-            # 设置代理格式
-            proxies = {
-                'http': proxy,
-                'https': proxy
-            }
-            
-            # 使用aiohttp异步测试
-            async with aiohttp.ClientSession() as session:
-                try:
-                    start_time = time.time()
-                    async with session.get('https://www.baidu.com', proxy=proxy, timeout=timeout) as response:
-                        if response.status == 200:
-                            elapsed = time.time() - start_time
-                            logger.debug(f"代理测试成功: {proxy}, 响应时间: {elapsed:.2f}秒")
-                            return True, proxy, f"状态码: {response.status}, 响应时间: {elapsed:.2f}秒"
-                        else:
-                            logger.debug(f"代理测试失败: {proxy}, 状态码: {response.status}")
-                            return False, proxy, f"状态码: {response.status}"
-                except Exception as e:
-                    logger.debug(f"代理测试异常: {proxy}, 错误: {str(e)}")
-                    return False, proxy, str(e)
+            start_time = time.time()
+            async with session.get(profile['url'], proxy=proxy, timeout=client_timeout) as response:
+                if response.status != 200:
+                    return False, f"状态码 {response.status}", None
+                content_type = response.headers.get('Content-Type', '')
+                if profile.get('content_type') and not content_type.startswith(profile['content_type']):
+                    return False, f"内容类型 {content_type or '未知'}", None
+                # 读完响应体，确认代理能完整转发数据
+                await response.read()
+                elapsed = time.time() - start_time
+                return True, f"{elapsed:.2f}秒", elapsed
         except Exception as e:
-            logger.debug(f"代理测试异常: {proxy}, 错误: {str(e)}")
-            return False, proxy, str(e)
+            return False, type(e).__name__, None
+
+    async def validate_proxies_async(self, proxies, on_pass, concurrency=10, timeout=5,
+                                     connect_timeout=2, should_stop=None):
+        """
+        流水线式验证代理：固定数量的 worker 共用一个会话，始终保持 concurrency 个检测在进行中，
+        某个检测结束立即补上下一个，不必等待同批最慢的代理超时；每个代理通过后立即回调发布
+        
+        Args:
+            proxies (iterable): 待验证的代理地址
+            on_pass (callable): 通过验证时的回调 on_pass(proxy, message, elapsed, capabilities)
+            concurrency (int): 同时进行的检测数
+            timeout (float): 单次检测总超时(秒)
+            connect_timeout (float): 连接超时(秒)
+            should_stop (callable, optional): 返回True时不再发起新的检测
+        
+        Returns:
+            tuple: (已检测数量, 通过数量)
+        """
+        candidates = iter(proxies)
+        counts = {"tested": 0, "passed": 0}
+        # 每个代理同时运行全部探测配置；保持证书校验，篡改 TLS 的代理无法通过 https/upload 探测
+        connector = aiohttp.TCPConnector(limit=concurrency * len(PROBE_PROFILES), force_close=True)
+
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async def worker():
+                # 所有 worker 共享同一个迭代器，单线程事件循环下 next() 不会竞争；
+                # 先检查停止条件再取下一个，未取出的代理保留在迭代器中
+                while should_stop is None or not should_stop():
+                    proxy = next(candidates, None)
+                    if proxy is None:
+                        return
+                    success, proxy, message, elapsed, capabilities = await self.test_proxy_async(
+                        proxy, timeout, session, connect_timeout
+                    )
+                    counts["tested"] += 1
+                    if success:
+                        counts["passed"] += 1
+                        on_pass(proxy, message, elapsed, capabilities)
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return counts["tested"], counts["passed"]
     
     async def refresh_pool_async(self, min_size=30, max_size=50, concurrency=10):
         """
@@ -197,49 +645,43 @@ class ProxyPool:
             return
             
         logger.info("开始异步刷新代理池")
-        # 获取新的代理
-        new_proxies = self.proxy_manager.get_proxies()
-        logger.info(f"从代理源获取了 {len(new_proxies)} 个代理")
+        # 只获取代理源中新出现的代理，列表未变化时不会重新下载解析
+        new_proxies = await self.harvester.harvest()
+        logger.info(f"从代理源获取了 {len(new_proxies)} 个新代理")
         
-        # 过滤掉已使用和已在池中的代理
-        filtered_proxies = [
-            proxy for proxy in new_proxies 
-            if proxy not in self.used_proxies and not any(p['proxy'] == proxy for p in self.available_proxies)
-        ]
-        logger.info(f"过滤后剩余 {len(filtered_proxies)} 个待测试代理")
-        
-        # 限制测试数量
-        test_proxies = filtered_proxies[:max(max_size - len(self.available_proxies), 0) * 3]  # 多测试一些，提高成功率
+        # 过滤掉已使用和已在池中的代理，未测试完的留到下次刷新
+        for proxy in new_proxies:
+            if proxy not in self.used_proxies and proxy not in self.available_proxies:
+                self.candidates[proxy] = None
+        logger.info(f"待测试代理 {len(self.candidates)} 个")
         
-        if not test_proxies:
+        if not self.candidates:
             logger.warning("没有新的代理可以测试")
             return
             
-        logger.info(f"开始测试 {len(test_proxies)} 个代理，并发数: {concurrency}")
-        # 创建测试任务
-        tasks = []
-        for proxy in test_proxies:
-            tasks.append(self.test_proxy_async(proxy))
-            
-        # 分批执行测试任务
-        count = 0
-        for i in range(0, len(tasks), concurrency):
-            batch = tasks[i:i+concurrency]
-            logger.debug(f"测试第 {i//concurrency + 1} 批代理，数量: {len(batch)}")
-            results = await asyncio.gather(*batch)
-            
-            for success, proxy, message in results:
-                if success and count < (max_size - len(self.available_proxies)):
-                    self.add_proxy(proxy, message)
-                    count += 1
-                    
-                if count >= (max_size - len(self.available_proxies)):
-                    break
-            
-            if count >= (max_size - len(self.available_proxies)):
-                break
+        logger.info(f"开始流水线测试 {len(self.candidates)} 个代理，并发数: {concurrency}")
+        before = len(self.available_proxies)
+
+        def take_candidates():
+            # popitem 是 O(1)，反复 next(iter(...)) 要跳过已删除的槽位，整体退化为 O(n²)
+            while self.candidates:
+                proxy, _ = self.candidates.popitem(last=False)
+                yield proxy
+
+        def publish(proxy, message, elapsed, capabilities):
+            if len(self.available_proxies) < max_size:
+                self.add_proxy(proxy, message, latency=elapsed, capabilities=capabilities)
+            else:
+                # 池已满，留到下次刷新
+                self.candidates[proxy] = None
+
+        tested, _ = await self.validate_proxies_async(
+            take_candidates(), publish, concurrency=concurrency,
+            should_stop=lambda: len(self.available_proxies) >= max_size,
+        )
         
-        logger.info(f"代理池刷新完成，新增 {count} 个可用代理，当前可用代理总数: {len(self.available_proxies)}")
+        count = len(self.available_proxies) - before
+        logger.info(f"代理池刷新完成，测试 {tested} 个，新增 {count} 个可用代理，当前可用代理总数: {len(self.available_proxies)}")
     
     def refresh_pool(self, min_size=10, max_size=50):
         """
@@ -260,14 +702,24 @@ class ProxyPool:
     
     # 在 ProxyPool 类中添加一个异步版本的 clear_expired 方法
     async def clear_expired_async(self):
-        """异步清除过期的代理"""
-        current_time = time.time()
-        self.available_proxies = [
-            proxy_info for proxy_info in self.available_proxies
-            if current_time - proxy_info['timestamp'] < self.expire_minutes * 60
-        ]
-        self.save_pool()
-        logger.info(f"清除过期代理后，剩余可用代理: {len(self.available_proxies)}")
+        """异步清除过期的代理，只从过期堆顶取出已到期的条目，不遍历整个池"""
+        now = time.time()
+        ttl = self.expire_minutes * 60
+        expired = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            deadline, proxy = heapq.heappop(self._expiry)
+            record = self.available_proxies.get(proxy)
+            # 跳过已移出池或已被新条目取代的堆条目
+            if record is None or record.expiry_deadline != deadline:
+                continue
+            if record.timestamp + ttl > now:
+                # 已被成功反馈续期，按新的过期时间重新入堆
+                self._push_expiry(record)
+                continue
+            self._expire(proxy)
+            expired += 1
+        if expired:
+            logger.info(f"清除 {expired} 个过期代理后，剩余可用代理: {len(self.available_proxies)}")
 
     async def retest_used_proxies_async(self, max_retest=100, concurrency=10):
         """
@@ -286,28 +738,19 @@ class ProxyPool:
         # 将集合转换为列表，以便可以限制测试数量
         test_proxies = list(self.used_proxies)[:max_retest]
         
-        # 创建测试任务
-        tasks = []
-        for proxy in test_proxies:
-            tasks.append(self.test_proxy_async(proxy))
-            
-        # 分批执行测试任务
         recovered_count = 0
-        for i in range(0, len(tasks), concurrency):
-            batch = tasks[i:i+concurrency]
-            logger.debug(f"重新测试第 {i//concurrency + 1} 批代理，数量: {len(batch)}")
-            results = await asyncio.gather(*batch)
-            
-            for success, proxy, message in results:
-                if success:
-                    # 从已使用代理集合中移除
-                    self.used_proxies.remove(proxy)
-                    # 添加到可用代理列表
-                    self.add_proxy(proxy, f"重新测试通过: {message}")
-                    recovered_count += 1
+
+        def recover(proxy, message, elapsed, capabilities):
+            nonlocal recovered_count
+            # 从已使用代理集合中移除
+            self.used_proxies.discard(proxy)
+            # 添加到可用代理列表
+            self.add_proxy(proxy, f"重新测试通过: {message}", latency=elapsed, capabilities=capabilities)
+            recovered_count += 1
+
+        await self.validate_proxies_async(test_proxies, recover, concurrency=concurrency)
         
         logger.info(f"已使用代理重新测试完成，恢复了 {recovered_count} 个代理到可用池")
-        self.save_pool()
 
 
 if __name__ == "__main__":
@@ -333,4 +776,5 @@ if __name__ == "__main__":
         logger.info(f"异步刷新后可用代理数量: {len(pool.available_proxies)}")
     
     # 运行异步测试
-    asyncio.run(test_async())
\ No newline at end of file
+    asyncio.run(test_async())
+    pool.save_pool()
\ No newline at end of file
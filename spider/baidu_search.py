@@ -12,16 +12,84 @@ import os
 import re
 import json
 import logging
+from collections import OrderedDict
 from aiohttp import ClientTimeout
 from spider.user_agent import UserAgent
-from utils.token_helper import get_acs_token_async
+from utils.token_helper import TokenManager
+from utils.upload_normalizer import UploadNormalizer, detect_image_type
 
 
 logger = logging.getLogger(__name__)
 
+SEARCH_RESULT_API = "https://graph.baidu.com/ajax/similardetailnew"
+
+# 结果记录字段 -> 接口条目中可能出现的键 (按优先级)
+RESULT_FIELDS = {
+    "thumb_url": ("thumbUrl", "thumbURL"),
+    "url": ("objURL", "objurl", "imgUrl", "middleURL", "hoverUrl"),
+    "width": ("width", "imgWidth"),
+    "height": ("height", "imgHeight"),
+    "source_url": ("fromUrl", "fromURL", "pageUrl"),
+}
+
+
+# 下载模式: thumb 缩略图；original 原图；best 像素数不超过 max_pixels 时取原图，否则取缩略图
+FETCH_MODES = ("thumb", "original", "best")
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def select_image_url(record, mode="thumb", max_pixels=None):
+    """
+    按下载模式为结果记录选择要下载的URL
+    
+    Args:
+        record: parse_result_item 返回的结果记录
+        mode: thumb / original / best
+        max_pixels: best 模式下原图允许的最大像素数，为None时不限
+    
+    Returns:
+        str: 选中的URL，记录中没有可用URL时返回None
+    """
+    if mode not in FETCH_MODES:
+        raise ValueError(f"未知的下载模式: {mode}，可选: {FETCH_MODES}")
+    thumb, original = record.get("thumb_url"), record.get("url")
+    if mode == "thumb" or not original:
+        return thumb or original
+    if mode == "original":
+        return original
+    width, height = _as_int(record.get("width")), _as_int(record.get("height"))
+    if max_pixels is None:
+        return original
+    if width and height and width * height <= max_pixels:
+        return original
+    # 原图超出上限或尺寸未知时，退回到缩略图
+    return thumb or original
+
+
+def parse_result_item(item):
+    """将接口返回的单个条目整理为结果记录，缺失字段为None，原始条目保存在 raw 中"""
+    record = {}
+    for field, keys in RESULT_FIELDS.items():
+        record[field] = next((item[k] for k in keys if item.get(k) not in (None, "")), None)
+    record["raw"] = item
+    return record
+
 class BaiduSimilarImageSpider:
-    def __init__(self):
+    def __init__(self, upload_max_edge=None, upload_quality=85, search_cache=None):
+        """
+        Args:
+            upload_max_edge (int, optional): 上传前把种子图片长边缩小到该像素数并重新编码为 JPEG，为None时上传原图
+            upload_quality (int): 重新编码的 JPEG 质量
+            search_cache (SearchCache, optional): 按种子图片内容缓存搜索结果，由调用方负责关闭
+        """
         self.max_page_size = 300
+        self.result_page_size = 50  # iter_results 默认每页条数
         self.upload_timeout = 60
         self.upload_connect_timeout = 10
         self.upload_sock_connect_timeout = 20
@@ -29,17 +97,62 @@ class BaiduSimilarImageSpider:
         self.upload_max_retries = 4
 
         self.upload_image_api = "https://graph.baidu.com/upload"
+        # 上传前的图片规范化 (可选)，在线程池中编码并按种子图片摘要缓存
+        self.upload_normalizer = UploadNormalizer(upload_max_edge, upload_quality) if upload_max_edge else None
+
+        # 连接池配置：同一会话在多次调用间复用，保持长连接并缓存 DNS
+        self.connector_limit = 100
+        self.connector_limit_per_host = 20
+        self.dns_cache_ttl = 300
+        self.keepalive_timeout = 30
+        self._session = None
+
+        # 搜索结果缓存: (session_id, sign) -> (过期时间, 结果数据)，同一次搜索重复解析时不再请求
+        self.result_cache_ttl = 300
+        self.result_cache_size = 256
+        self._result_cache = OrderedDict()
+        # 持久化搜索缓存: 种子图片摘要 -> 结果列表，命中时跳过上传和 token
+        self.search_cache = search_cache
         
-        # Token caching
-        self._acs_token = None
-        self._token_timestamp = 0
+        # Token caching: pre-minted pool with single-flight background refresh
         self._token_expiry = 1800  # 30 minutes
+        self.token_manager = TokenManager(ttl=self._token_expiry)
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """获取爬虫持有的共享会话，首次调用或会话已关闭时创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connector_limit,
+                limit_per_host=self.connector_limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        """关闭共享会话及其连接池，并停止 token 后台刷新"""
+        await self.token_manager.close()
+        if self.upload_normalizer is not None:
+            self.upload_normalizer.close()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        await self.get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
-    async def _get_valid_token(self, force_refresh=False):
-        """Get a valid acs-token, refreshing if necessary."""
+    async def _get_valid_token(self, rejected_token=None):
+        """Get a valid acs-token from the token pool. A rejected token is dropped first."""
         try:
-            # Pass force_refresh to the helper
-            token = await get_acs_token_async(force_refresh=force_refresh)
+            if rejected_token:
+                self.token_manager.invalidate(rejected_token)
+            token = await self.token_manager.get_token()
             if token:
                 logger.info(f"Successfully obtained acs-token: {token[:20]}...")
             else:
@@ -49,130 +162,339 @@ class BaiduSimilarImageSpider:
             logger.error(f"Error obtaining acs-token: {e}")
             return None
 
+    async def _prepare_upload(self, image_bytes):
+        """
+        准备上传内容，启用规范化时缩小并重新编码，否则按文件头标注真实类型
+
+        Returns:
+            tuple: (图片字节, Content-Type, 文件名)
+        """
+        if self.upload_normalizer is not None:
+            return await self.upload_normalizer.normalize(image_bytes)
+        content_type, ext = detect_image_type(image_bytes)
+        return image_bytes, content_type, f"image{ext}"
+
     async def search_image(
         self,
         image_bytes: bytes, 
-        headers: dict
+        headers: dict,
+        proxy: str = None,
+        on_upload=None
     ) -> str:
-        # Initial token fetch (tries disk first)
-        token = await self._get_valid_token(force_refresh=False)
+        """
+        上传图片并返回搜索URL，失败时返回空字符串
+
+        on_upload(success, elapsed) 在每次经过代理的上传请求结束后调用，只计入这一次请求的耗时，
+        不包含等待 token 和图片规范化的时间；403 视为 token 失效，不计入代理结果
+        """
+        # Pre-minted token, only blocks when the pool is empty
+        token = await self._get_valid_token()
         if token:
             headers["acs-token"] = token
             
-        async with aiohttp.ClientSession() as session:
-            logger.info(f"开始上传图像, 图像文件内容大小: {len(image_bytes)} bytes")
-
-            timeout = ClientTimeout(
-                    total=self.upload_timeout,  # 设置整个请求的超时
-                    connect=self.upload_connect_timeout,  # 设置连接的超时
-                    sock_connect=self.upload_sock_connect_timeout,  # 设置套接字连接超时
-                    sock_read=self.upload_sock_read_timeout  # 设置读取数据的超时
-            )
-            retries = 0
-            while retries < self.upload_max_retries:
-                try:
-                    form = aiohttp.FormData()
-                    form.add_field('image', image_bytes, filename='image.jpg', content_type='image/jpeg')
+        session = await self.get_session()
+        # 在重试循环之外准备一次，重试时直接复用
+        image_bytes, content_type, filename = await self._prepare_upload(image_bytes)
+        logger.info(f"开始上传图像, 图像文件内容大小: {len(image_bytes)} bytes ({content_type})")
+
+        timeout = ClientTimeout(
+                total=self.upload_timeout,  # 设置整个请求的超时
+                connect=self.upload_connect_timeout,  # 设置连接的超时
+                sock_connect=self.upload_sock_connect_timeout,  # 设置套接字连接超时
+                sock_read=self.upload_sock_read_timeout  # 设置读取数据的超时
+        )
+        retries = 0
+        while retries < self.upload_max_retries:
+            start = time.monotonic()
+            try:
+                form = aiohttp.FormData()
+                form.add_field('image', image_bytes, filename=filename, content_type=content_type)
+                
+                # 添加 uptime 参数
+                uptime = int(time.time() * 1000)
+                upload_url = f"{self.upload_image_api}?uptime={uptime}"
+
+                async with session.post(upload_url, headers=headers, data=form, ssl=False, timeout=timeout,
+                                        proxy=proxy or None) as response:
+                    if on_upload is not None and response.status != 403:
+                        on_upload(response.status == 200, time.monotonic() - start)
+                    # Handle text response first to check for errors
+                    # text = await response.text()
+                    # print(text) 
+                    # Only print text if error occurs or for debug
                     
-                    # 添加 uptime 参数
-                    uptime = int(time.time() * 1000)
-                    upload_url = f"{self.upload_image_api}?uptime={uptime}"
-
-                    async with session.post(upload_url, headers=headers, data=form, ssl=False, timeout=timeout) as response:
-                        # Handle text response first to check for errors
-                        # text = await response.text()
-                        # print(text) 
-                        # Only print text if error occurs or for debug
-                        
-                        if response.status == 200:
-                            try:
-                                resp_data = await response.json()
-                            except Exception:
-                                # Not JSON, might be an error page
-                                text = await response.text()
-                                logger.error(f"Response is not JSON: {text[:200]}")
-                                # Check if it's a token error (heuristic)
-                                # If we haven't retried with a new token yet, try once
-                                if "为了保障您的账号安全" in text or "验证码" in text: # Example error messages
-                                     # Force refresh token and retry
-                                     logger.warning("Token might be invalid, refreshing...")
-                                     token = await self._get_valid_token(force_refresh=True)
-                                     if token:
-                                         headers["acs-token"] = token
-                                         retries += 1
-                                         continue
+                    if response.status == 200:
+                        try:
+                            resp_data = await response.json()
+                        except Exception:
+                            # Not JSON, might be an error page
+                            text = await response.text()
+                            logger.error(f"Response is not JSON: {text[:200]}")
+                            # Check if it's a token error (heuristic)
+                            # If we haven't retried with a new token yet, try once
+                            if "为了保障您的账号安全" in text or "验证码" in text: # Example error messages
+                                 # Force refresh token and retry
+                                 logger.warning("Token might be invalid, refreshing...")
+                                 token = await self._get_valid_token(rejected_token=headers.get("acs-token"))
+                                 if token:
+                                     headers["acs-token"] = token
+                                     retries += 1
+                                     continue
 
-                                return ""
+                            return ""
 
-                            if "data" in resp_data and "url" in resp_data["data"]:
-                                search_url_base = resp_data["data"]["url"]
-                            # 提取session_id和sign，处理search返回为None的情况
-                            session_match = re.search(r'session_id=([0-9]+)', search_url_base)
-                            sign_match = re.search(r'sign=([a-fA-F0-9]+)', search_url_base)
+                        if "data" in resp_data and "url" in resp_data["data"]:
+                            search_url_base = resp_data["data"]["url"]
+                        # 提取session_id和sign，处理search返回为None的情况
+                        session_match = re.search(r'session_id=([0-9]+)', search_url_base)
+                        sign_match = re.search(r'sign=([a-fA-F0-9]+)', search_url_base)
+                        
+                        if not session_match or not sign_match:
+                            logger.error("无法从URL中提取session_id或sign")
+                            return ""
                             
-                            if not session_match or not sign_match:
-                                logger.error("无法从URL中提取session_id或sign")
-                                return ""
-                                
-                            session_id = session_match.group(1)
-                            sign = sign_match.group(1)
+                        session_id = session_match.group(1)
+                        sign = sign_match.group(1)
 
-                            search_url = f"https://graph.baidu.com/ajax/similardetailnew?card_key=common&carousel=1&contsign=&curAlbum=0&entrance=GENERAL&f=general&image=&index=0&inspire=common&jumpIndex=&next=2&pageFrom=graph_upload_wise&page_size={self.max_page_size}&render_type=card_all&session_id={session_id}&sign={sign}&srcp=&wd=&page=1"
-                            logger.info(f"图像上传成功，URL: {search_url}")
-                            return search_url
-                        else:
-                            logger.error(f"图像上传失败，状态码: {response.status}")
-                            if 403 == response.status:
-                                logger.warning("Received 403, token likely expired. Refreshing token...")
-                                token = await self._get_valid_token(force_refresh=True)
-                                if token:
-                                    headers["acs-token"] = token
-                                    # Continue retries
-                                
-                                retries += 1
-                                if retries < self.upload_max_retries:
-                                    await asyncio.sleep(2 ** retries) # Exponential backoff
-                                else:
-                                    return ""
+                        search_url = self.build_search_url(session_id, sign)
+                        logger.info(f"图像上传成功，URL: {search_url}")
+                        return search_url
+                    else:
+                        logger.error(f"图像上传失败，状态码: {response.status}")
+                        if 403 == response.status:
+                            logger.warning("Received 403, token likely expired. Refreshing token...")
+                            token = await self._get_valid_token(rejected_token=headers.get("acs-token"))
+                            if token:
+                                headers["acs-token"] = token
+                                # Continue retries
+                            
+                            retries += 1
+                            if retries < self.upload_max_retries:
+                                await asyncio.sleep(2 ** retries) # Exponential backoff
                             else:
                                 return ""
+                        else:
+                            return ""
 
-                except aiohttp.ClientError as e:
-                    retries += 1
-                    logger.error(f"网络错误，无法上传图像, 错误信息: {str(e)} - 重试 {retries}/{self.upload_max_retries}")
-                    if retries < self.upload_max_retries:
-                        await asyncio.sleep(2 ** retries)  # 指数退避
-                    else:
-                        logger.error(f"已达到最大重试次数，放弃上传")
-                        return ""
-                
-                except Exception as e:
-                    logger.error(f"上传图像时出错, 错误信息: {str(e)}")
+            except aiohttp.ClientError as e:
+                if on_upload is not None:
+                    on_upload(False, time.monotonic() - start)
+                retries += 1
+                logger.error(f"网络错误，无法上传图像, 错误信息: {str(e)} - 重试 {retries}/{self.upload_max_retries}")
+                if retries < self.upload_max_retries:
+                    await asyncio.sleep(2 ** retries)  # 指数退避
+                else:
+                    logger.error(f"已达到最大重试次数，放弃上传")
                     return ""
+            
+            except Exception as e:
+                if on_upload is not None and isinstance(e, asyncio.TimeoutError):
+                    on_upload(False, time.monotonic() - start)
+                logger.error(f"上传图像时出错, 错误信息: {str(e)}")
+                return ""
     
-    async def __call__(self, image_bytes: bytes, proxy=None) -> str:
+    async def __call__(self, image_bytes: bytes, proxy=None, on_upload=None) -> str:
+        """上传图片，只返回搜索URL；需要结果列表时使用 search()"""
         user_agent = UserAgent()
         headers = {"User-Agent": user_agent()}
 
-        search_url = await self.search_image(image_bytes, headers)
+        return await self.search_image(image_bytes, headers, proxy, on_upload)
+
+    async def search(self, image_bytes: bytes, proxy=None, limit=None, fetch_mode="thumb",
+                     max_pixels=None, use_cache=True, on_upload=None) -> dict:
+        """
+        上传图片并获取相似图片结果，整个搜索只请求一次结果接口
+        
+        Args:
+            image_bytes: 图片字节数据
+            proxy: 上传使用的代理地址
+            limit: 最多需要的结果数，小于 max_page_size 时只请求这么多条
+            fetch_mode: images_url 使用的下载模式，见 FETCH_MODES
+            max_pixels: best 模式下原图允许的最大像素数
+            use_cache: 是否先查找持久化搜索缓存；调用方已通过 search_cached() 查过时传 False，结果仍会写入缓存
+            on_upload: 每次经过代理的上传请求结束后调用 on_upload(success, elapsed)，
+                结果接口不经过代理，其耗时和失败不会计入
+        
+        Returns:
+            dict: {"search_url", "session_id", "sign", "images_url", "items", "metadata", "cached"}，
+                  上传失败时返回None
+        """
+        if limit and limit >= self.max_page_size:
+            limit = None  # 一次请求最多返回 max_page_size 条，与不限数量相同
+        if use_cache:
+            result = await self.search_cached(image_bytes, limit, fetch_mode, max_pixels)
+            if result is not None:
+                return result
+
+        search_url = await self(image_bytes=image_bytes, proxy=proxy, on_upload=on_upload)
+        if not search_url:
+            return None
+        key = self._search_key(search_url)
+        if limit and key:
+            search_url = self.build_search_url(key[0], key[1], page_size=limit)
         logger.info(f"请求search_url并整理相似图片url: {search_url}")
-        search_images_url = await self.postprocess(search_url)
-        logger.info(f"获取相似图片成功，demo:{search_images_url[0]}")
+        result = await self.fetch_results(search_url)
+        if self.search_cache is not None and result["items"]:
+            await asyncio.to_thread(self.search_cache.put, image_bytes, result, limit)
+        result = self._select_urls({**result, "cached": False}, fetch_mode, max_pixels)
+        if result["images_url"]:
+            logger.info(f"获取相似图片成功，demo:{result['images_url'][0]}")
+        return result
+
+    async def search_cached(self, image_bytes: bytes, limit=None, fetch_mode="thumb", max_pixels=None):
+        """
+        只从持久化搜索缓存中读取结果，不上传也不使用代理，参数含义同 search()
+        
+        Returns:
+            dict: 与 search() 相同、"cached" 为 True 的结果，未启用缓存或未命中时返回None
+        """
+        if self.search_cache is None:
+            return None
+        if limit and limit >= self.max_page_size:
+            limit = None
+        result = await asyncio.to_thread(self.search_cache.get, image_bytes, limit)
+        if result is None:
+            return None
+        logger.info(f"命中搜索缓存，跳过上传: {result['search_url']}")
+        result["cached"] = True
+        if limit:
+            result["items"] = result["items"][:limit]
+            result["images_url"] = result["images_url"][:limit]
+        return self._select_urls(result, fetch_mode, max_pixels)
+
+    @staticmethod
+    def _select_urls(result, fetch_mode, max_pixels):
+        """按下载模式重新选择 images_url，原结果 (可能在缓存中) 保持不变"""
+        if fetch_mode == "thumb":
+            return result
+        records = (parse_result_item(item) for item in result["items"])
+        images_url = [select_image_url(record, fetch_mode, max_pixels) for record in records]
+        return {**result, "images_url": [url for url in images_url if url]}
+
+    def build_search_url(self, session_id, sign, page=1, page_size=None):
+        """构造相似图片结果接口的分页URL"""
+        return (f"{SEARCH_RESULT_API}?card_key=common&carousel=1&contsign=&curAlbum=0&entrance=GENERAL&f=general"
+                f"&image=&index=0&inspire=common&jumpIndex=&next=2&pageFrom=graph_upload_wise"
+                f"&page_size={page_size or self.max_page_size}&render_type=card_all&session_id={session_id}"
+                f"&sign={sign}&srcp=&wd=&page={page}")
+
+    @staticmethod
+    def _search_key(search_url):
+        """从搜索URL中提取 (session_id, sign, page, page_size)，作为结果缓存的键"""
+        session_match = re.search(r'session_id=([0-9]+)', search_url)
+        sign_match = re.search(r'sign=([a-fA-F0-9]+)', search_url)
+        if not session_match or not sign_match:
+            return None
+        page_match = re.search(r'[?&]page=([0-9]+)', search_url)
+        size_match = re.search(r'page_size=([0-9]+)', search_url)
+        return (session_match.group(1), sign_match.group(1),
+                int(page_match.group(1)) if page_match else 1,
+                int(size_match.group(1)) if size_match else None)
+
+    async def fetch_results(self, search_url) -> dict:
+        """
+        请求搜索URL并解析结果，短时间内对同一次搜索的重复调用直接命中缓存
         
-        return search_url
+        Returns:
+            dict: {"search_url", "session_id", "sign", "images_url", "items", "metadata"}
+        """
+        key = self._search_key(search_url)
+        now = time.monotonic()
+        cached = self._result_cache.get(key) if key else None
+        if cached is not None and cached[0] > now:
+            self._result_cache.move_to_end(key)
+            return cached[1]
+
+        session = await self.get_session()
+        async with session.get(search_url) as response:
+            if response.status != 200:
+                # 抛出异常，调用方按搜索失败处理，不会把临时错误当成空结果
+                raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                  status=response.status, message="请求搜索结果失败")
+            search_data = await response.json()
+        data = search_data.get("data") or {}
+        items = data.get("list") or []
+        result = {
+            "search_url": search_url,
+            "session_id": key[0] if key else None,
+            "sign": key[1] if key else None,
+            "images_url": [item["thumbUrl"] for item in items if item.get("thumbUrl")],
+            "items": items,
+            "metadata": {k: v for k, v in data.items() if k != "list"},
+        }
+
+        # 只缓存有结果的响应，临时的空结果或错误数据不会在后续调用中一直命中
+        if key and items:
+            self._result_cache[key] = (now + self.result_cache_ttl, result)
+            self._result_cache.move_to_end(key)
+            while len(self._result_cache) > self.result_cache_size:
+                self._result_cache.popitem(last=False)
+        return result
 
     async def postprocess(self, search_url):
-        async with aiohttp.ClientSession() as session:
-             async with session.get(search_url) as response:
-                search_data = await response.json()
-                images_url = [item["thumbUrl"] for item in search_data["data"]["list"]]
-                return images_url
+        """返回搜索结果中的缩略图URL列表 (结果会被缓存，重复调用不再请求)"""
+        return (await self.fetch_results(search_url))["images_url"]
+
+    async def iter_results(self, search_url, limit=None, page_size=None):
+        """
+        逐页异步迭代搜索结果：按需请求下一页，并在处理当前页时预取下一页
+        
+        Args:
+            search_url: search_image 返回的搜索URL (只用到其中的 session_id 和 sign)
+            limit: 最多返回的结果数，为None时迭代到最后一页
+            page_size: 每页条数，默认取 result_page_size 与 limit 中较小者
+        
+        Yields:
+            dict: 结果记录 {"thumb_url", "url", "width", "height", "source_url", "raw"}
+        """
+        if limit is not None and limit <= 0:
+            return
+        key = self._search_key(search_url)
+        if key is None:
+            logger.error("无法从URL中提取session_id或sign")
+            return
+        session_id, sign = key[0], key[1]
+        page_size = page_size or self.result_page_size
+        if limit is not None:
+            page_size = min(page_size, limit)
+        page_size = min(page_size, self.max_page_size)
+
+        def fetch(page):
+            return asyncio.ensure_future(
+                self.fetch_results(self.build_search_url(session_id, sign, page, page_size))
+            )
+
+        count = 0
+        page = 1
+        pending = fetch(page)
+        try:
+            while pending is not None:
+                items = (await pending)["items"]
+                # 最后一页 (条数不足一页) 或已达到数量上限时不再预取
+                remaining = None if limit is None else limit - count
+                more = len(items) >= page_size and (remaining is None or remaining > len(items))
+                page += 1
+                pending = fetch(page) if more else None
+                for item in items:
+                    yield parse_result_item(item)
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
+        finally:
+            if pending is not None:
+                if not pending.done():
+                    pending.cancel()
+                elif not pending.cancelled():
+                    # 调用方提前结束时预取可能已经失败，取出异常避免 "Task exception was never retrieved"
+                    pending.exception()
 
 
 if __name__ == "__main__":
-    spider = BaiduSimilarImageSpider()
-    with open("./test_image/1.png", "rb") as f:
-        image_bytes = f.read()
+    async def _demo():
+        async with BaiduSimilarImageSpider() as spider:
+            with open("./test_image/1.png", "rb") as f:
+                image_bytes = f.read()
+            return await spider.search(image_bytes=image_bytes)
 
-    search_url = asyncio.run(spider(image_bytes=image_bytes))
+    result = asyncio.run(_demo())
     # print(search_url)
\ No newline at end of file
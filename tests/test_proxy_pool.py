@@ -0,0 +1,213 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# The proxy service modules import each other by bare module name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "proxy"))
+
+import proxy_pool  # noqa: E402
+from pool_store import PoolPersister  # noqa: E402
+from proxy_pool import ProxyPool  # noqa: E402
+
+
+class FakeClock:
+    """Stands in for the time module inside proxy_pool so tests can move time forward."""
+
+    def __init__(self, real):
+        self._real = real
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock(proxy_pool.time)
+    monkeypatch.setattr(proxy_pool, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def make_pool(tmp_path, clock):
+    def make(**kwargs):
+        kwargs.setdefault("pool_file", str(tmp_path / "proxy_pool.json"))
+        kwargs.setdefault("spread_top_k", 1)
+        return ProxyPool(**kwargs)
+
+    return make
+
+
+def fill(pool, latencies, capabilities=("https", "upload")):
+    for i, latency in enumerate(latencies):
+        pool.add_proxy(f"10.0.0.{i}:80", latency=latency, capabilities=capabilities)
+
+
+def test_get_proxy_prefers_best_score_and_filters_capability(make_pool):
+    pool = make_pool()
+    fill(pool, [2.0, 0.5])
+    pool.add_proxy("10.0.0.9:80", latency=0.1, capabilities=("https",))
+
+    assert pool.get_proxy() == "10.0.0.9:80"
+    assert pool.get_proxy("upload") == "10.0.0.1:80"
+    assert pool.get_proxy("download") is None
+    # plain checkouts do not reserve slots
+    assert pool.available_proxies["10.0.0.9:80"].inflight == 0
+
+
+def test_plain_checkouts_spread_over_top_k(make_pool):
+    pool = make_pool(spread_top_k=2)
+    fill(pool, [0.5, 0.6, 5.0, 5.0])
+
+    seen = {pool.get_proxy() for _ in range(200)}
+    assert seen == {"10.0.0.0:80", "10.0.0.1:80"}
+
+
+def test_report_updates_score_and_breaker_half_opens(make_pool, clock):
+    pool = make_pool(breaker_threshold=2, quarantine_seconds=30)
+    fill(pool, [0.5, 3.0])
+    best, other = "10.0.0.0:80", "10.0.0.1:80"
+
+    assert pool.report(best, False)
+    assert pool.report(best, False)
+    assert pool.quarantined_count == 1
+    assert pool.get_proxy() == other
+    assert not pool.report("10.9.9.9:80", True)
+
+    clock.advance(31)
+    assert pool.get_proxy() == best
+    # half-open: one more failure quarantines again
+    pool.report(best, False)
+    assert pool.get_proxy() == other
+
+    clock.advance(31)
+    pool.report(best, True, latency=0.2)
+    assert pool.available_proxies[best].failures == 0
+    assert pool.get_proxy() == best
+
+
+def test_lease_reserves_slots_and_release_reports(make_pool):
+    pool = make_pool(max_inflight_per_proxy=4)
+    fill(pool, [0.5, 1.0])
+
+    first = pool.lease("upload", max_concurrency=4)
+    second = pool.lease("upload", max_concurrency=4)
+    assert first.proxy == "10.0.0.0:80"
+    assert second.proxy == "10.0.0.1:80"
+    assert pool.lease("upload") is None
+    # a saturated proxy still serves plain checkouts
+    assert pool.get_proxy("upload") is not None
+
+    assert pool.release_lease(first.lease_id, success=True, latency=0.1)
+    record = pool.available_proxies[first.proxy]
+    assert record.inflight == 0
+    assert record.latency < 0.5
+    assert not pool.release_lease(first.lease_id)
+
+
+def test_expired_lease_frees_slots_and_still_accepts_report(make_pool, clock):
+    pool = make_pool(max_inflight_per_proxy=4, expire_minutes=10)
+    fill(pool, [0.5])
+    lease = pool.lease(ttl=10, max_concurrency=4)
+    assert pool.renew_lease(lease.lease_id, ttl=20) is lease
+
+    clock.advance(15)
+    assert pool.lease(max_concurrency=1) is None
+
+    clock.advance(10)
+    assert pool.renew_lease(lease.lease_id) is None
+    assert pool.available_proxies[lease.proxy].inflight == 0
+    assert pool.release_lease(lease.lease_id, success=False)
+    assert pool.available_proxies[lease.proxy].failures == 1
+    assert not pool.release_lease(lease.lease_id, success=False)
+
+
+def test_clear_expired_keeps_renewed_proxies(make_pool, clock):
+    pool = make_pool(expire_minutes=1)
+    fill(pool, [0.5, 1.0])
+
+    clock.advance(40)
+    pool.report("10.0.0.1:80", True, latency=1.0)
+    clock.advance(30)
+    asyncio.run(pool.clear_expired_async())
+
+    assert list(pool.available_proxies) == ["10.0.0.1:80"]
+    assert pool.used_proxies == {"10.0.0.0:80"}
+    assert pool.get_proxy() == "10.0.0.1:80"
+
+
+def test_heaps_stay_bounded_under_reports(make_pool):
+    pool = make_pool()
+    fill(pool, [0.5, 1.0, 1.5])
+    for i in range(10_000):
+        proxy = pool.get_proxy("upload")
+        pool.report(proxy, i % 7 != 0, latency=0.5)
+
+    limit = 4 * len(pool.available_proxies) + 64
+    assert all(len(heap) <= limit for heap in pool._heaps.values())
+
+
+def test_http_only_proxies_are_not_admitted(make_pool):
+    pool = make_pool()
+
+    async def probe(session, proxy, profile, client_timeout):
+        return profile["url"].startswith("http://"), "ok", 0.1
+
+    pool._probe = probe
+    success, _, _, _, capabilities = asyncio.run(pool.test_proxy_async("10.0.0.1:80", session=object()))
+    assert not success
+    assert capabilities == {"http"}
+
+
+def test_journal_round_trip(make_pool, tmp_path):
+    pool = make_pool(journal=True)
+    fill(pool, [0.5, 1.0, 1.5])
+    pool.persister.flush()
+    pool.report("10.0.0.1:80", True, latency=0.2)
+    pool._expire("10.0.0.2:80")
+    pool.persister.flush()
+    assert os.path.exists(pool.persister.journal_path)
+
+    loaded = make_pool(journal=True)
+    assert set(loaded.available_proxies) == {"10.0.0.0:80", "10.0.0.1:80"}
+    assert loaded.used_proxies == {"10.0.0.2:80"}
+    assert loaded.available_proxies["10.0.0.1:80"].latency == pool.available_proxies["10.0.0.1:80"].latency
+    assert loaded.available_proxies["10.0.0.1:80"].capabilities == {"https", "upload"}
+
+
+def test_journal_compacts_into_snapshot(tmp_path):
+    path = str(tmp_path / "pool.json")
+    state = {"used_proxies": [], "available_proxies": []}
+    infos = {}
+    persister = PoolPersister(path, lambda: state, get_info=infos.get, journal=True, compact_every=3)
+
+    for i in range(3):
+        infos[f"p{i}"] = {"proxy": f"p{i}", "timestamp": i}
+        persister.upsert(f"p{i}")
+    persister.flush()
+    assert os.path.exists(persister.journal_path) and not os.path.exists(path)
+
+    state["available_proxies"] = list(infos.values())
+    persister.upsert("p0")
+    persister.flush()
+    assert os.path.exists(path) and not os.path.exists(persister.journal_path)
+    assert PoolPersister(path, dict).load() == state
+
+
+def test_load_skips_http_only_records(make_pool):
+    pool = make_pool()
+    pool.add_proxy("10.0.0.1:80", latency=0.5, capabilities=("http",))
+    pool.add_proxy("10.0.0.2:80", latency=0.5, capabilities=("https",))
+    pool.add_proxy("10.0.0.3:80", latency=0.5)
+    pool.save_pool()
+
+    loaded = make_pool()
+    assert set(loaded.available_proxies) == {"10.0.0.2:80", "10.0.0.3:80"}
@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+
+from utils import token_helper
+from utils.token_helper import TokenBrowser, TokenManager, get_token_browser
+
+
+class FakeRequest:
+    def __init__(self, headers):
+        self._headers = headers
+
+    async def all_headers(self):
+        return self._headers
+
+
+class FakeFileInput:
+    def __init__(self, page):
+        self.page = page
+
+    async def set_input_files(self, files):
+        assert files["mimeType"] == "image/jpeg" and files["buffer"]
+        if self.page.fail_uploads:
+            self.page.fail_uploads -= 1
+            raise RuntimeError("page crashed")
+        self.page.uploads += 1
+        token = f"{self.page.name}-token-{self.page.uploads}"
+        # Playwright dispatches request events asynchronously
+        asyncio.ensure_future(self.page.handler(FakeRequest({"acs-token": token})))
+
+
+class FakePage:
+    def __init__(self, name):
+        self.name = name
+        self.handler = None
+        self.warm = False
+        self.closed = False
+        self.uploads = 0
+        self.gotos = 0
+        self.fail_uploads = 0
+
+    def on(self, event, handler):
+        assert event == "request"
+        self.handler = handler
+
+    async def query_selector(self, selector):
+        return FakeFileInput(self) if self.warm else None
+
+    async def goto(self, url, **kwargs):
+        self.gotos += 1
+        self.warm = True
+
+    async def wait_for_selector(self, selector, **kwargs):
+        return FakeFileInput(self)
+
+    def is_closed(self):
+        return self.closed
+
+
+class FakeBrowser:
+    def __init__(self, name):
+        self.page = FakePage(name)
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        browser = self
+
+        class Context:
+            async def new_page(self):
+                return browser.page
+
+        return Context()
+
+    async def close(self):
+        self.connected = False
+
+
+class FakePlaywright:
+    def __init__(self, launched):
+        self.launched = launched
+        self.chromium = self
+
+    async def launch(self, **kwargs):
+        browser = FakeBrowser(f"browser{len(self.launched)}")
+        self.launched.append(browser)
+        return browser
+
+    async def stop(self):
+        pass
+
+
+@pytest.fixture
+def launched(monkeypatch, tmp_path):
+    """Replace Playwright with fakes and keep the token file out of the repo."""
+    browsers = []
+
+    class Starter:
+        async def start(self):
+            return FakePlaywright(browsers)
+
+    monkeypatch.setattr(token_helper, "async_playwright", lambda: Starter())
+    monkeypatch.setattr(token_helper, "TOKEN_FILE", str(tmp_path / "acs_token.json"))
+    return browsers
+
+
+def test_mint_reuses_warm_page(launched):
+    async def run():
+        browser = TokenBrowser()
+        tokens = [await browser.mint() for _ in range(3)]
+        await browser.close()
+        return tokens
+
+    assert asyncio.run(run()) == ["browser0-token-1", "browser0-token-2", "browser0-token-3"]
+    assert len(launched) == 1
+    assert launched[0].page.gotos == 1
+    assert not launched[0].connected
+
+
+def test_mint_restarts_after_failure(launched):
+    async def run():
+        browser = TokenBrowser()
+        await browser.start()
+        launched[0].page.fail_uploads = 1
+        token = await browser.mint()
+        await browser.close()
+        return browser, token
+
+    browser, token = asyncio.run(run())
+    assert token == "browser1-token-1"
+    assert browser.restarts == 1
+    assert len(launched) == 2
+
+
+def test_mint_relaunches_disconnected_browser(launched):
+    async def run():
+        browser = TokenBrowser()
+        first = await browser.mint()
+        launched[0].connected = False
+        second = await browser.mint()
+        await browser.close()
+        return first, second
+
+    assert asyncio.run(run()) == ("browser0-token-1", "browser1-token-1")
+
+
+def test_closing_one_manager_keeps_the_other_browser(launched):
+    async def run():
+        first, second = TokenManager(pool_size=1), TokenManager(pool_size=1)
+        assert await first.get_token()
+        assert await second.get_token()
+        await first.close()
+        token = await second.refresh()
+        await second.close()
+        return token
+
+    token = asyncio.run(run())
+    assert len(launched) == 2
+    owner = next(browser for browser in launched if token.startswith(browser.page.name))
+    assert owner.page.uploads >= 2
+    assert not any(browser.connected for browser in launched)
+
+
+def test_shared_browser_is_bound_to_the_running_loop():
+    async def get_twice():
+        return get_token_browser(), get_token_browser()
+
+    first_a, first_b = asyncio.run(get_twice())
+    second_a, _ = asyncio.run(get_twice())
+    assert first_a is first_b
+    assert second_a is not first_a
+
+
+def test_manager_rejects_empty_pool():
+    with pytest.raises(ValueError):
+        TokenManager(mint=lambda: None, pool_size=0)
@@ -0,0 +1,142 @@
+import os
+import time
+import sqlite3
+import logging
+import mimetypes
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+
+
+class ContentStore:
+    """
+    按内容 SHA-256 寻址的图片存储
+
+    文件按摘要前缀分片保存在 root/ab/cd/<digest><ext>，相同内容只保存一份；
+    同时在 root/index.sqlite3 中持久化 URL -> 摘要 的索引，
+    已经下载过的 URL 可以直接命中，无需任何网络请求。
+    """
+
+    def __init__(self, root, shard_depth=2, index_name="index.sqlite3"):
+        """
+        Args:
+            root (str): 存储根目录
+            shard_depth (int): 分片目录层数，每层取摘要的 2 个十六进制字符
+            index_name (str): 索引数据库文件名
+        """
+        self.root = root
+        self.shard_depth = shard_depth
+        self.tmp_dir = os.path.join(root, ".tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+        self.index_path = os.path.join(root, index_name)
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "digest TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER, created_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "url TEXT PRIMARY KEY, digest TEXT NOT NULL, created_at REAL)"
+        )
+        self._conn.commit()
+
+        # 运行期统计
+        self.stats = {"url_hits": 0, "stored": 0, "deduplicated": 0}
+
+    def path_for(self, digest, ext=".jpg"):
+        """根据摘要计算分片后的存储路径"""
+        shards = [digest[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, f"{digest}{ext}")
+
+    def lookup(self, url):
+        """
+        查找 URL 对应的已存储文件
+
+        Args:
+            url (str): 图片URL
+
+        Returns:
+            str: 已存储文件路径，未下载过或文件已丢失时返回None
+        """
+        row = self._conn.execute(
+            "SELECT b.path FROM urls u JOIN blobs b ON u.digest = b.digest WHERE u.url = ?",
+            (url,),
+        ).fetchone()
+        if row and os.path.exists(row[0]):
+            self.stats["url_hits"] += 1
+            return row[0]
+        return None
+
+    def add_file(self, url, tmp_path, digest, ext=".jpg"):
+        """
+        将已完成下载的临时文件纳入存储，并记录 URL 索引
+
+        Args:
+            url (str): 图片URL
+            tmp_path (str): 临时文件路径(需位于同一文件系统，如 self.tmp_dir)
+            digest (str): 文件内容的 SHA-256 十六进制摘要
+            ext (str): 文件扩展名
+
+        Returns:
+            str: 存储后的文件路径
+        """
+        now = time.time()
+        try:
+            row = self._conn.execute("SELECT path FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row and os.path.exists(row[0]):
+                # 相同内容已存在，丢弃本次下载的副本
+                os.remove(tmp_path)
+                path = row[0]
+                self.stats["deduplicated"] += 1
+            else:
+                path = self.path_for(digest, ext)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                size = os.path.getsize(tmp_path)
+                os.replace(tmp_path, path)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO blobs (digest, path, size, created_at) VALUES (?, ?, ?, ?)",
+                    (digest, path, size, now),
+                )
+                self.stats["stored"] += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (url, digest, created_at) VALUES (?, ?, ?)",
+                (url, digest, now),
+            )
+            self._conn.commit()
+        except BaseException:
+            # 入库失败时清理尚未移走的临时文件，避免在 tmp_dir 中堆积 .part
+            self._conn.rollback()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return path
+
+    def iter_paths(self):
+        """遍历存储中的全部文件路径"""
+        for (path,) in self._conn.execute("SELECT path FROM blobs ORDER BY created_at").fetchall():
+            if os.path.exists(path):
+                yield path
+
+    def close(self):
+        """关闭索引数据库"""
+        self._conn.close()
+
+
+def guess_extension(url, content_type=None):
+    """
+    根据URL路径或Content-Type推断图片扩展名，无法判断时默认为 .jpg
+    """
+    ext = os.path.splitext(urlparse(url).path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return ext
+    if content_type:
+        ext = mimetypes.guess_extension(content_type.split(';')[0].strip())
+        if ext in IMAGE_EXTENSIONS:
+            return ext
+    return ".jpg"
@@ -0,0 +1,144 @@
+import os
+import time
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 种子状态
+SEED_PENDING = "pending"    # 尚未搜索
+SEED_SEARCHED = "searched"  # 已搜索，仍有URL未下载成功
+SEED_DONE = "done"          # 全部URL已下载
+SEED_FAILED = "failed"      # 搜索失败，下次运行重试
+
+# URL 下载状态
+URL_PENDING = "pending"
+URL_DONE = "done"
+URL_FAILED = "failed"
+
+
+class CrawlState:
+    """
+    基于 SQLite 的持久化爬取状态
+
+    记录每张种子图片的状态、搜索URL、结果URL列表以及每个URL的下载状态，
+    进程崩溃或中断后重新运行即可从中断处继续：已完成的种子直接跳过，
+    已搜索过的种子不会重新上传，只重试未成功的下载。
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path (str): 状态数据库文件路径
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seeds ("
+            "name TEXT PRIMARY KEY, status TEXT NOT NULL, search_url TEXT, "
+            "attempts INTEGER DEFAULT 0, error TEXT, updated_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "seed TEXT NOT NULL, url TEXT NOT NULL, position INTEGER, status TEXT NOT NULL, "
+            "path TEXT, updated_at REAL, PRIMARY KEY (seed, url))"
+        )
+        self._conn.commit()
+
+    def add_seeds(self, names):
+        """登记种子图片，已存在的种子保持原有状态"""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO seeds (name, status, updated_at) VALUES (?, ?, ?)",
+            [(name, SEED_PENDING, now) for name in names],
+        )
+        self._conn.commit()
+
+    def get_status(self, name):
+        """返回种子状态，未登记时返回None"""
+        row = self._conn.execute("SELECT status FROM seeds WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def get_search_url(self, name):
+        """返回种子已记录的搜索URL"""
+        row = self._conn.execute("SELECT search_url FROM seeds WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def mark_searching(self, name):
+        """记录一次搜索尝试"""
+        self._conn.execute(
+            "UPDATE seeds SET attempts = attempts + 1, updated_at = ? WHERE name = ?",
+            (time.time(), name),
+        )
+        self._conn.commit()
+
+    def mark_searched(self, name, search_url, urls):
+        """
+        记录搜索结果
+
+        Args:
+            name (str): 种子图片名
+            search_url (str): 搜索URL
+            urls (list): 相似图片URL列表
+        """
+        now = time.time()
+        with self._conn:
+            self._conn.execute(
+                "UPDATE seeds SET status = ?, search_url = ?, error = NULL, updated_at = ? WHERE name = ?",
+                (SEED_SEARCHED, search_url, now, name),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO results (seed, url, position, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(name, url, position, URL_PENDING, now) for position, url in enumerate(urls)],
+            )
+
+    def mark_failed(self, name, error):
+        """记录搜索失败，下次运行会重试"""
+        self._conn.execute(
+            "UPDATE seeds SET status = ?, error = ?, updated_at = ? WHERE name = ?",
+            (SEED_FAILED, str(error), time.time(), name),
+        )
+        self._conn.commit()
+
+    def pending_urls(self, name):
+        """返回种子中尚未下载成功的URL(含失败的)，按搜索结果顺序排列"""
+        rows = self._conn.execute(
+            "SELECT url FROM results WHERE seed = ? AND status != ? ORDER BY position",
+            (name, URL_DONE),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def mark_url(self, name, url, path):
+        """记录单个URL的下载结果，path为None表示下载失败"""
+        self._conn.execute(
+            "UPDATE results SET status = ?, path = ?, updated_at = ? WHERE seed = ? AND url = ?",
+            (URL_DONE if path else URL_FAILED, path, time.time(), name, url),
+        )
+        self._conn.commit()
+
+    def finish_seed(self, name):
+        """
+        下载阶段结束后更新种子状态：全部URL成功则标记完成，否则保持已搜索以便重试
+
+        Returns:
+            str: 更新后的种子状态
+        """
+        status = SEED_DONE if not self.pending_urls(name) else SEED_SEARCHED
+        self._conn.execute(
+            "UPDATE seeds SET status = ?, updated_at = ? WHERE name = ?",
+            (status, time.time(), name),
+        )
+        self._conn.commit()
+        return status
+
+    def summary(self):
+        """按状态统计种子和URL数量"""
+        seeds = dict(self._conn.execute("SELECT status, COUNT(*) FROM seeds GROUP BY status").fetchall())
+        urls = dict(self._conn.execute("SELECT status, COUNT(*) FROM results GROUP BY status").fetchall())
+        return {"seeds": seeds, "urls": urls}
+
+    def close(self):
+        """关闭状态数据库"""
+        self._conn.close()
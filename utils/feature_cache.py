@@ -0,0 +1,158 @@
+import os
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FeatureCache:
+    """
+    图片预处理结果缓存，按文件内容的 SHA-256 寻址
+
+    每个条目是 {名称: np.ndarray} 字典 (如 SSIM 用的灰度图、LPIPS 各层特征)。
+    浮点数组默认以 float16 保存 (VGG 特征图每张图片数十 MB，减半后内存层能容纳的图片数翻倍)，
+    读取时还原为 float32。内存层按总字节数做 LRU 淘汰；可选的磁盘层把条目保存为 .npy，
+    读取时以 memmap 方式打开，不会整体载入内存。
+    """
+
+    def __init__(self, max_bytes=1 << 30, disk_dir=None, store_dtype=np.float16, max_keys=100000):
+        """
+        Args:
+            max_bytes (int): 内存层最大字节数
+            disk_dir (str): 磁盘层目录，为None时只使用内存层
+            store_dtype: 浮点数组的保存精度，为None时按原精度保存
+            max_keys (int): 文件摘要记忆的最大条目数
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self.store_dtype = np.dtype(store_dtype) if store_dtype is not None else None
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._key_memo = OrderedDict()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key_for(self, path):
+        """计算文件内容摘要，按 (路径, 大小, 修改时间) 记忆避免重复读文件"""
+        st = os.stat(path)
+        memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        key = self._key_memo.get(memo_key)
+        if key is not None:
+            self._key_memo.move_to_end(memo_key)
+            return key
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(chunk)
+        key = hasher.hexdigest()
+        self._key_memo[memo_key] = key
+        while len(self._key_memo) > self.max_keys:
+            self._key_memo.popitem(last=False)
+        return key
+
+    def get(self, key, required=()):
+        """
+        读取缓存条目
+
+        Args:
+            key (str): 内容摘要
+            required (tuple): 条目必须包含的字段，缺失时视为未命中
+
+        Returns:
+            dict: 缓存条目 (以低精度保存的数组已还原为 float32)，未命中时返回None
+        """
+        entry = self._entries.get(key)
+        if entry is not None and all(name in entry for name in required):
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return _restore(entry)
+
+        entry = self._load_from_disk(key)
+        if entry is not None and all(name in entry for name in required):
+            self.stats["disk_hits"] += 1
+            return _restore(entry)
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key, entry):
+        """写入缓存条目，已有条目时合并字段"""
+        entry = {name: self._pack(array) for name, array in entry.items()}
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= _entry_bytes(old)
+            entry = {**old, **entry}
+        self._entries[key] = entry
+        self._bytes += _entry_bytes(entry)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= _entry_bytes(evicted)
+            self.stats["evictions"] += 1
+        if self.disk_dir:
+            self._save_to_disk(key, entry)
+
+    def _pack(self, array):
+        """浮点数组转为 store_dtype 保存，其他数组保持不变"""
+        array = np.asarray(array)
+        if self.store_dtype is not None and array.dtype.kind == "f" \
+                and array.dtype.itemsize > self.store_dtype.itemsize:
+            return array.astype(self.store_dtype)
+        return array
+
+    def clear(self):
+        """清空内存层"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def _entry_dir(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _save_to_disk(self, key, entry):
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        for name, array in entry.items():
+            target = os.path.join(entry_dir, f"{name}.npy")
+            if os.path.exists(target):
+                continue
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(tmp_path, target)
+            except Exception as e:
+                logger.warning(f"写入特征缓存失败 {target}: {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        entry_dir = self._entry_dir(key)
+        if not os.path.isdir(entry_dir):
+            return None
+        entry = {}
+        for filename in os.listdir(entry_dir):
+            if filename.endswith(".npy"):
+                entry[filename[:-4]] = np.load(os.path.join(entry_dir, filename), mmap_mode="r")
+        return entry or None
+
+
+def _restore(entry):
+    """将 float16 数组还原为 float32，调用方可直接与新计算的特征拼接"""
+    return {name: array.astype(np.float32) if array.dtype == np.float16 else array
+            for name, array in entry.items()}
+
+
+def _entry_bytes(entry):
+    return sum(getattr(array, "nbytes", 0) for array in entry.values())
@@ -1,13 +1,17 @@
 import os
+import time
 import torch
 import lpips
 import numpy as np
 import cv2
 from skimage.metrics import structural_similarity as ssim
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from PIL import Image
 import torchvision.transforms as transforms
 
+from utils.phash_index import PHashIndex, phash, hamming
+from utils.feature_cache import FeatureCache
+
 # 每个进程加载一次 LPIPS 模型，避免重复加载和多进程 Pickling 问题
 _lpips_model = None
 
@@ -71,66 +75,438 @@ def compare_single_image(orig_tensor, orig_gray, comp_path):
         print(f"⚠️ 对比失败 {comp_path}: {e}")
         return comp_path, 0.0, 1.0, False
 
+def lpips_features(model, img_tensor):
+    """计算 LPIPS 各层归一化后的 VGG 特征，可对参考图只计算一次后复用"""
+    in_tensor = model.scaling_layer(img_tensor) if model.version == '0.1' else img_tensor
+    outs = model.net.forward(in_tensor)
+    return [lpips.normalize_tensor(outs[kk]) for kk in range(model.L)]
+
+def lpips_from_features(model, ref_feats, comp_feats):
+    """由预先计算的特征得到 LPIPS 距离，参考图特征 (batch=1) 会广播到整个候选批次"""
+    val = 0
+    for kk in range(model.L):
+        diff = (ref_feats[kk] - comp_feats[kk]) ** 2
+        val = val + model.lins[kk](diff).mean([2, 3], keepdim=True)
+    return val.view(-1)
+
+# 级联过滤的默认阶段顺序与阈值
+CASCADE_STAGES = ('size', 'hist', 'phash', 'ssim', 'lpips')
+DEFAULT_CASCADE_THRESHOLDS = {
+    'min_side': 32,              # 短边最小像素数
+    'max_aspect_log_ratio': 0.7, # |log(候选宽高比 / 原图宽高比)| 上限，约为 2 倍
+    'hist_bins': 4,              # 每个颜色通道的直方图分箱数
+    'max_hist_distance': 1.2,    # 归一化颜色直方图的 L1 距离上限 (0~2)
+    'max_phash_distance': 28,    # 感知哈希汉明距离上限 (0~64)
+}
+
+def load_thumbnail(img_path, size=(128, 128)):
+    """解码为小尺寸 RGB 缩略图，JPEG 会利用 draft 模式直接按缩小比例解码"""
+    img = Image.open(img_path)
+    img.draft('RGB', size)
+    img = img.convert('RGB')
+    img.thumbnail(size)
+    return img
+
+def color_histograms(images, bins=4, sample_size=(64, 64)):
+    """
+    向量化计算一组图片的归一化 RGB 联合直方图
+    :return: 形状为 (N, bins**3) 的数组
+    """
+    arr = np.stack([np.asarray(img.resize(sample_size)) for img in images])
+    q = (arr.astype(np.uint16) * bins) >> 8
+    idx = (q[..., 0] * bins + q[..., 1]) * bins + q[..., 2]
+    n_bins = bins ** 3
+    idx = idx.reshape(len(images), -1) + (np.arange(len(images)) * n_bins)[:, None]
+    hist = np.bincount(idx.ravel(), minlength=len(images) * n_bins).reshape(len(images), n_bins)
+    return hist / hist.sum(axis=1, keepdims=True)
+
 class ImageSimilarityFilter:
-    """图片相似度多进程过滤工具类"""
+    """
+    图片相似度多进程过滤工具类
+
+    进程池和 LPIPS 模型在多次 filter_images 调用之间复用，
+    使用完毕后调用 close()，或通过 with 语句管理生命周期。
+    """
     
-    def __init__(self, ssim_threshold=0.5, lpips_threshold=0.6):
+    def __init__(self, ssim_threshold=0.5, lpips_threshold=0.6, dedup_distance=None,
+                 max_workers=4, num_threads=None, feature_cache=None,
+                 cascade=None, cascade_thresholds=None):
         """
         :param ssim_threshold: SSIM 阈值，大于该值认为相似 (越高越好，最大1.0)
         :param lpips_threshold: LPIPS 阈值，小于该值认为相似 (越低越好，最小0.0)
+        :param dedup_distance: 感知哈希去重的最大汉明距离，设置后在比较前剔除近重复候选图，None 表示不去重
+        :param max_workers: 默认并行进程数 (批处理模式下为解码线程数)
+        :param num_threads: 批处理模式下 torch 的算子内线程数，None 表示使用 torch 默认值
+        :param feature_cache: FeatureCache 实例，按内容哈希缓存预处理结果 (灰度图、LPIPS 特征)，
+            重复对同一批图片按不同阈值打分时只需执行比较步骤
+        :param cascade: 级联过滤阶段列表，取自 CASCADE_STAGES，每个阶段只处理上一阶段的幸存图片；
+            None 表示对全部候选图计算 SSIM 与 LPIPS
+        :param cascade_thresholds: 覆盖 DEFAULT_CASCADE_THRESHOLDS 中的阈值
         """
         self.ssim_threshold = ssim_threshold
         self.lpips_threshold = lpips_threshold
+        self.dedup_distance = dedup_distance
+        self.max_workers = max_workers
+        self.num_threads = num_threads
+        self.feature_cache = feature_cache
+        if cascade is not None:
+            unknown = set(cascade) - set(CASCADE_STAGES)
+            if unknown:
+                raise ValueError(f"未知的级联阶段: {sorted(unknown)}")
+        self.cascade = tuple(cascade) if cascade is not None else None
+        self.cascade_thresholds = {**DEFAULT_CASCADE_THRESHOLDS, **(cascade_thresholds or {})}
+        # 最近一次级联过滤各阶段的统计 {阶段: {'input', 'rejected', 'seconds'}}
+        self.last_cascade_stats = None
+        # 最近一次批处理的吞吐统计
+        self.last_stats = None
+        self._executor = None
+        self._executor_workers = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """关闭常驻进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._executor_workers = None
+
+    def _get_executor(self, max_workers):
+        """获取常驻进程池，进程数变化时重建；每个进程只在初始化时加载一次 LPIPS 模型"""
+        if self._executor is not None and self._executor_workers != max_workers:
+            self.close()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker)
+            self._executor_workers = max_workers
+        return self._executor
+
+    def _get_model(self):
+        """在当前进程中加载 (或复用) LPIPS 模型，供批处理模式使用"""
+        global _lpips_model
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        if _lpips_model is None:
+            init_worker()
+        return _lpips_model
+
+    def warmup(self, batch_size=None):
+        """预先加载模型：批处理模式加载进程内模型，否则启动常驻进程池"""
+        if batch_size:
+            self._get_model()
+        else:
+            executor = self._get_executor(self.max_workers)
+            # 提交空任务促使所有进程完成初始化
+            list(executor.map(int, range(self.max_workers)))
         
-    def filter_images(self, orig_path, comp_paths, max_workers=4):
+    def filter_images(self, orig_path, comp_paths, max_workers=None, batch_size=None):
         """
         通过多进程并行对比，过滤掉不相似的图片
         :param orig_path: 参考原图路径
         :param comp_paths: 待比较的图片路径列表
-        :param max_workers: 并行进程数
+        :param max_workers: 并行进程数 (批处理模式下为解码线程数)，默认使用构造时的 max_workers
+        :param batch_size: 设置后使用单进程批处理模式，按该大小分批计算 LPIPS
         :return: (过滤后保留的路径列表, 详细对比结果字典列表)
         """
-        orig_tensor, orig_gray = process_image(orig_path)
+        max_workers = max_workers or self.max_workers
+        orig_tensor, orig_gray = self._load_image(orig_path)
         if orig_tensor is None:
             raise ValueError(f"无法加载参考原图: {orig_path}")
             
         results = []
         filtered_paths = []
+
+        if self.dedup_distance is not None:
+            comp_paths, duplicates = PHashIndex().dedupe(comp_paths, max_distance=self.dedup_distance)
+            print(f"🧹 感知哈希去重: 剔除 {len(duplicates)} 张近重复图片")
+
+        if self.cascade is not None:
+            return self._filter_images_cascade(orig_path, orig_tensor, orig_gray, comp_paths,
+                                               batch_size or 16, max_workers)
+
+        if batch_size:
+            return self._filter_images_batched(orig_path, orig_tensor, orig_gray, comp_paths,
+                                               batch_size, max_workers)
         
         print(f"🚀 开始使用 {max_workers} 个进程并行比较 {len(comp_paths)} 张图片...")
         
-        # 使用 ProcessPoolExecutor 开启多进程
-        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker) as executor:
-            # 提交所有的比较任务
-            future_to_path = {
-                executor.submit(compare_single_image, orig_tensor, orig_gray, path): path 
-                for path in comp_paths
-            }
-            
-            # 收集完成的结果
-            for future in as_completed(future_to_path):
-                path, ssim_val, lpips_val, success = future.result()
-                if not success:
-                    continue
-                    
-                # 判定是否相似 (需同时满足 SSIM 和 LPIPS 的条件)
-                is_similar = (ssim_val >= self.ssim_threshold) and (lpips_val <= self.lpips_threshold)
-                
-                results.append({
-                    'path': path,
-                    'ssim': ssim_val,
-                    'lpips': lpips_val,
-                    'is_similar': is_similar
-                })
+        # 使用常驻的 ProcessPoolExecutor，跨调用复用已加载模型的进程
+        executor = self._get_executor(max_workers)
+        # 提交所有的比较任务
+        future_to_path = {
+            executor.submit(compare_single_image, orig_tensor, orig_gray, path): path 
+            for path in comp_paths
+        }
+        
+        # 收集完成的结果
+        for future in as_completed(future_to_path):
+            path, ssim_val, lpips_val, success = future.result()
+            if not success:
+                continue
                 
-                if is_similar:
-                    filtered_paths.append(path)
+            self._collect(path, ssim_val, lpips_val, results, filtered_paths)
                     
         # 按照 LPIPS(升序) 和 SSIM(降序) 对结果进行排序，越相似的越靠前
         results.sort(key=lambda x: (x['lpips'], -x['ssim']))
         
         return filtered_paths, results
 
+    def _load_image(self, path):
+        """读取并预处理图像，启用缓存时按内容哈希复用结果"""
+        if self.feature_cache is None:
+            return process_image(path)
+        try:
+            key = self.feature_cache.key_for(path)
+        except OSError as e:
+            print(f"⚠️ 加载图片失败 {path}: {e}")
+            return None, None
+        entry = self.feature_cache.get(key, required=('tensor', 'gray'))
+        if entry is not None:
+            return torch.from_numpy(np.array(entry['tensor'])), np.asarray(entry['gray'])
+        img_tensor, img_gray = process_image(path)
+        if img_tensor is not None:
+            self.feature_cache.put(key, {'tensor': img_tensor.numpy(), 'gray': img_gray})
+        return img_tensor, img_gray
+
+    def _cached_features(self, path, model):
+        """返回缓存中的 (灰度图, LPIPS 特征列表)，未命中时返回None"""
+        if self.feature_cache is None:
+            return None
+        feat_names = tuple(f'feat{kk}' for kk in range(model.L))
+        try:
+            entry = self.feature_cache.get(self.feature_cache.key_for(path), required=('gray',) + feat_names)
+        except OSError:
+            return None
+        if entry is None:
+            return None
+        return np.asarray(entry['gray']), [entry[name] for name in feat_names]
+
+    def _store_features(self, path, img_tensor, img_gray, feats):
+        """将单张图片的预处理结果与 LPIPS 特征写入缓存"""
+        if self.feature_cache is None:
+            return
+        entry = {'tensor': img_tensor.numpy(), 'gray': img_gray}
+        for kk, feat in enumerate(feats):
+            entry[f'feat{kk}'] = feat.cpu().numpy()
+        self.feature_cache.put(self.feature_cache.key_for(path), entry)
+
+    def _batch_features(self, paths, model, device, loader):
+        """
+        计算一批图片的灰度图与 LPIPS 特征，缓存命中的图片跳过解码和 VGG 前向
+
+        :return: (有效路径列表, 灰度图列表, 各层特征 [B, C, H, W] 列表)
+        """
+        cached = [(path, self._cached_features(path, model)) for path in paths]
+        hit = [(path, item) for path, item in cached if item is not None]
+        miss = [path for path, item in cached if item is None]
+
+        valid_paths = [path for path, _ in hit]
+        grays = [gray for _, (gray, _) in hit]
+        layers = [[] for _ in range(model.L)]
+        if hit:
+            for kk in range(model.L):
+                stacked = np.stack([np.asarray(feats[kk])[0] for _, (_, feats) in hit])
+                layers[kk].append(torch.from_numpy(stacked).to(device))
+
+        # 解码与缩放在线程池中进行 (PIL 会释放 GIL)
+        loaded = [
+            (path, tensor, gray)
+            for path, (tensor, gray) in zip(miss, loader.map(process_image, miss))
+            if tensor is not None
+        ]
+        if loaded:
+            batch = torch.cat([tensor for _, tensor, _ in loaded]).to(device)
+            fresh = lpips_features(model, batch)
+            for idx, (path, tensor, gray) in enumerate(loaded):
+                self._store_features(path, tensor, gray, [feat[idx:idx + 1] for feat in fresh])
+                valid_paths.append(path)
+                grays.append(gray)
+            for kk in range(model.L):
+                layers[kk].append(fresh[kk])
+
+        feats = [torch.cat(layer) for layer in layers] if valid_paths else []
+        return valid_paths, grays, feats
+
+    def _reference_features(self, orig_path, orig_tensor, orig_gray, model, device):
+        """参考图的 LPIPS 特征，启用缓存时只计算一次"""
+        cached = self._cached_features(orig_path, model)
+        if cached is not None:
+            return [torch.from_numpy(np.array(feat)).to(device) for feat in cached[1]]
+        ref_feats = lpips_features(model, orig_tensor.to(device))
+        self._store_features(orig_path, orig_tensor, orig_gray, ref_feats)
+        return ref_feats
+
+    def _collect(self, path, ssim_val, lpips_val, results, filtered_paths):
+        """判定是否相似 (需同时满足 SSIM 和 LPIPS 的条件) 并记录结果"""
+        is_similar = (ssim_val >= self.ssim_threshold) and (lpips_val <= self.lpips_threshold)
+        
+        results.append({
+            'path': path,
+            'ssim': ssim_val,
+            'lpips': lpips_val,
+            'is_similar': is_similar
+        })
+        
+        if is_similar:
+            filtered_paths.append(path)
+
+    def _filter_images_batched(self, orig_path, orig_tensor, orig_gray, comp_paths, batch_size, max_workers):
+        """
+        单进程批处理模式：参考图特征只计算一次，候选图按固定大小堆叠成批次，
+        在 torch.inference_mode 下整批计算 LPIPS
+        """
+        model = self._get_model()
+        device = next(model.parameters()).device
+
+        results = []
+        filtered_paths = []
+        start = time.perf_counter()
+        print(f"🚀 开始批处理比较 {len(comp_paths)} 张图片, batch_size={batch_size}, 设备: {device}")
+
+        with torch.inference_mode(), ThreadPoolExecutor(max_workers=max_workers) as loader:
+            ref_feats = self._reference_features(orig_path, orig_tensor, orig_gray, model, device)
+            for i in range(0, len(comp_paths), batch_size):
+                batch_paths, grays, feats = self._batch_features(
+                    comp_paths[i:i + batch_size], model, device, loader
+                )
+                if not batch_paths:
+                    continue
+                scores = lpips_from_features(model, ref_feats, feats).cpu().tolist()
+                for path, gray, lpips_val in zip(batch_paths, grays, scores):
+                    ssim_val = ssim(orig_gray, gray, data_range=255)
+                    self._collect(path, ssim_val, lpips_val, results, filtered_paths)
+
+        elapsed = time.perf_counter() - start
+        throughput = len(results) / elapsed if elapsed > 0 else 0.0
+        self.last_stats = {'count': len(results), 'seconds': elapsed, 'images_per_second': throughput}
+        print(f"⚡ 批处理完成: {len(results)} 张, 用时 {elapsed:.2f}s, 吞吐 {throughput:.1f} 张/秒")
+        if self.feature_cache is not None:
+            print(f"🗃️ 特征缓存: {self.feature_cache.stats}")
+
+        results.sort(key=lambda x: (x['lpips'], -x['ssim']))
+        return filtered_paths, results
+
+    def _filter_images_cascade(self, orig_path, orig_tensor, orig_gray, comp_paths, batch_size, max_workers):
+        """
+        级联过滤：按 self.cascade 的顺序依次执行各阶段，每个阶段只处理上一阶段的幸存图片，
+        廉价阶段 (尺寸、颜色直方图、感知哈希) 先剔除明显无关的图片，最后才运行 SSIM / LPIPS
+        """
+        th = self.cascade_thresholds
+        scores = {path: {'path': path, 'ssim': None, 'lpips': None, 'rejected_by': None} for path in comp_paths}
+        thumbs = {}
+        stats = {}
+        ref_thumb = load_thumbnail(orig_path)
+        with Image.open(orig_path) as im:
+            ref_size = im.size
+
+        def get_thumbs(paths):
+            missing = [p for p in paths if p not in thumbs]
+            for path, thumb in zip(missing, loader.map(_safe_thumbnail, missing)):
+                thumbs[path] = thumb
+            return [p for p in paths if thumbs[p] is not None]
+
+        def stage_size(paths):
+            ref_ratio = np.log(ref_size[0] / ref_size[1])
+            kept = []
+            for path in paths:
+                try:
+                    # 只读取文件头，不解码像素
+                    with Image.open(path) as im:
+                        w, h = im.size
+                except Exception:
+                    continue
+                if min(w, h) >= th['min_side'] and abs(np.log(w / h) - ref_ratio) <= th['max_aspect_log_ratio']:
+                    kept.append(path)
+            return kept
+
+        def stage_hist(paths):
+            paths = get_thumbs(paths)
+            if not paths:
+                return []
+            bins = th['hist_bins']
+            ref_hist = color_histograms([ref_thumb], bins)[0]
+            dists = np.abs(color_histograms([thumbs[p] for p in paths], bins) - ref_hist).sum(axis=1)
+            return [p for p, d in zip(paths, dists) if d <= th['max_hist_distance']]
+
+        def stage_phash(paths):
+            paths = get_thumbs(paths)
+            ref_hash = phash(ref_thumb)
+            return [p for p in paths if hamming(phash(thumbs[p]), ref_hash) <= th['max_phash_distance']]
+
+        def stage_ssim(paths):
+            kept = []
+            for path in paths:
+                _, gray = self._load_image(path)
+                if gray is None:
+                    continue
+                scores[path]['ssim'] = ssim(orig_gray, gray, data_range=255)
+                if scores[path]['ssim'] >= self.ssim_threshold:
+                    kept.append(path)
+            return kept
+
+        def stage_lpips(paths):
+            model = self._get_model()
+            device = next(model.parameters()).device
+            kept = []
+            ref_feats = self._reference_features(orig_path, orig_tensor, orig_gray, model, device)
+            for i in range(0, len(paths), batch_size):
+                batch_paths, _, feats = self._batch_features(paths[i:i + batch_size], model, device, loader)
+                if not batch_paths:
+                    continue
+                values = lpips_from_features(model, ref_feats, feats).cpu().tolist()
+                for path, lpips_val in zip(batch_paths, values):
+                    scores[path]['lpips'] = lpips_val
+                    if lpips_val <= self.lpips_threshold:
+                        kept.append(path)
+            return kept
+
+        stage_funcs = {'size': stage_size, 'hist': stage_hist, 'phash': stage_phash,
+                       'ssim': stage_ssim, 'lpips': stage_lpips}
+
+        survivors = list(comp_paths)
+        with torch.inference_mode(), ThreadPoolExecutor(max_workers=max_workers) as loader:
+            for stage in self.cascade:
+                start = time.perf_counter()
+                kept = stage_funcs[stage](survivors) if survivors else []
+                kept_set = set(kept)
+                for path in survivors:
+                    if path not in kept_set:
+                        scores[path]['rejected_by'] = stage
+                stats[stage] = {
+                    'input': len(survivors),
+                    'rejected': len(survivors) - len(kept),
+                    'seconds': time.perf_counter() - start,
+                }
+                survivors = kept
+
+        self.last_cascade_stats = stats
+        print("🪜 级联过滤统计:")
+        for stage, st in stats.items():
+            per_item = st['seconds'] / st['input'] * 1e6 if st['input'] else 0.0
+            print(f"   {stage:<6} 输入 {st['input']:>5} | 剔除 {st['rejected']:>5} | "
+                  f"用时 {st['seconds'] * 1000:.1f}ms ({per_item:.0f}µs/张)")
+
+        survivor_set = set(survivors)
+        results = []
+        for path in comp_paths:
+            record = scores[path]
+            record['is_similar'] = path in survivor_set
+            results.append(record)
+        results.sort(key=lambda x: (x['lpips'] if x['lpips'] is not None else float('inf'),
+                                    -(x['ssim'] or 0.0)))
+        return survivors, results
+
+def _safe_thumbnail(img_path):
+    """load_thumbnail 的容错版本，解码失败返回None"""
+    try:
+        return load_thumbnail(img_path)
+    except Exception as e:
+        print(f"⚠️ 加载图片失败 {img_path}: {e}")
+        return None
+
 if __name__ == '__main__':
     # ================= 🚀 调用样例 =================
     
@@ -150,13 +526,12 @@ if __name__ == '__main__':
             
     comp_imgs = [f'test_images/comp_{i}.jpg' for i in range(1, 6)]
     
-    # 2. 初始化过滤器
+    # 2. 初始化过滤器 (with 结束时关闭常驻进程池，期间可多次调用 filter_images)
     # - SSIM 一般 > 0.5 认为结构相似
     # - LPIPS 一般 < 0.6 认为语义/感知相似
-    img_filter = ImageSimilarityFilter(ssim_threshold=0.5, lpips_threshold=0.6)
-    
-    # 3. 运行多进程过滤
-    filtered_list, detailed_results = img_filter.filter_images(orig_img, comp_imgs, max_workers=4)
+    with ImageSimilarityFilter(ssim_threshold=0.5, lpips_threshold=0.6, max_workers=4) as img_filter:
+        # 3. 运行多进程过滤
+        filtered_list, detailed_results = img_filter.filter_images(orig_img, comp_imgs)
     
     # 4. 打印结果
     print("\n📊 --- 对比结果 ---")
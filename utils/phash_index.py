@@ -0,0 +1,244 @@
+import os
+import logging
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+
+def _to_gray(image, size):
+    """打开(如需要)并缩放为灰度图，返回 float32 数组"""
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    img = image.convert('L').resize(size, Image.Resampling.LANCZOS)
+    return np.asarray(img, dtype=np.float32)
+
+
+def _pack_bits(bits):
+    """将 64 个布尔值打包为 uint64"""
+    return int(np.packbits(bits.astype(np.uint8).ravel()).view('>u8')[0])
+
+
+def _dct_matrix(n):
+    """DCT-II 正交变换矩阵"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    mat = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    mat[0] /= np.sqrt(2.0)
+    return mat.astype(np.float32)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def dhash(image, hash_size=8):
+    """
+    差异哈希：比较相邻像素亮度
+
+    Args:
+        image: 图片路径或 PIL.Image
+        hash_size (int): 哈希边长，8 对应 64 位
+
+    Returns:
+        int: 64 位哈希值
+    """
+    pixels = _to_gray(image, (hash_size + 1, hash_size))
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image, hash_size=8, highfreq_factor=4):
+    """
+    感知哈希：取 DCT 低频系数与其中位数比较，对缩放和重新编码鲁棒
+
+    Args:
+        image: 图片路径或 PIL.Image
+        hash_size (int): 哈希边长，8 对应 64 位
+        highfreq_factor (int): 缩放边长相对 hash_size 的倍数
+
+    Returns:
+        int: 64 位哈希值
+    """
+    size = hash_size * highfreq_factor
+    pixels = _to_gray(image, (size, size))
+    dct_mat = _DCT_32 if size == 32 else _dct_matrix(size)
+    dct = dct_mat @ pixels @ dct_mat.T
+    low = dct[:hash_size, :hash_size]
+    return _pack_bits(low > np.median(low))
+
+
+def hamming(a, b):
+    """两个哈希值之间的汉明距离"""
+    return bin(a ^ b).count('1')
+
+
+def hamming_many(hashes, value):
+    """
+    向量化计算一组哈希与目标哈希的汉明距离
+
+    Args:
+        hashes (np.ndarray): uint64 哈希数组
+        value (int): 目标哈希
+
+    Returns:
+        np.ndarray: 每个哈希对应的距离
+    """
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class BKTree:
+    """基于汉明距离的 BK 树，支持在给定半径内快速检索"""
+
+    def __init__(self):
+        self.root = None  # 节点结构: [hash, item_id, {distance: child}]
+
+    def add(self, value, item_id):
+        if self.root is None:
+            self.root = [value, item_id, {}]
+            return
+        node = self.root
+        while True:
+            dist = hamming(value, node[0])
+            child = node[2].get(dist)
+            if child is None:
+                node[2][dist] = [value, item_id, {}]
+                return
+            node = child
+
+    def query(self, value, max_distance):
+        """
+        Returns:
+            list: [(item_id, distance), ...]，距离不超过 max_distance 的所有条目
+        """
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            dist = hamming(value, node[0])
+            if dist <= max_distance:
+                found.append((node[1], dist))
+            lo, hi = dist - max_distance, dist + max_distance
+            for child_dist, child in node[2].items():
+                if lo <= child_dist <= hi:
+                    stack.append(child)
+        return found
+
+
+class PHashIndex:
+    """
+    近重复图片索引
+
+    哈希值保存在紧凑的 uint64 NumPy 数组中，通过 BK 树按汉明距离检索，
+    可以在 LPIPS 等昂贵的比较之前快速剔除同一图片的不同尺寸/编码版本。
+    """
+
+    def __init__(self, hash_func=phash):
+        """
+        Args:
+            hash_func: 哈希函数，phash 或 dhash
+        """
+        self.hash_func = hash_func
+        self.keys = []
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+        self._tree = BKTree()
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def hashes(self):
+        """已索引的哈希数组(只读视图)"""
+        return self._hashes[:len(self.keys)]
+
+    def add(self, key, image=None, value=None):
+        """
+        添加一个条目
+
+        Args:
+            key: 条目标识(如文件路径或内容摘要)
+            image: 图片路径或 PIL.Image，未提供 value 时用于计算哈希
+            value (int): 预先计算好的哈希值
+
+        Returns:
+            int: 条目哈希值
+        """
+        if value is None:
+            value = self.hash_func(image if image is not None else key)
+        idx = len(self.keys)
+        if idx == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._hashes[idx] = value
+        self.keys.append(key)
+        self._tree.add(value, idx)
+        return value
+
+    def query(self, value, max_distance=6):
+        """
+        检索与给定哈希距离不超过 max_distance 的条目
+
+        Returns:
+            list: [(key, distance), ...]，按距离升序排列
+        """
+        found = self._tree.query(value, max_distance)
+        found.sort(key=lambda x: x[1])
+        return [(self.keys[idx], dist) for idx, dist in found]
+
+    def find_duplicate(self, value, max_distance=6):
+        """返回最接近的近重复条目 key，不存在时返回None"""
+        found = self.query(value, max_distance)
+        return found[0][0] if found else None
+
+    def dedupe(self, paths, max_distance=6):
+        """
+        对一组图片去除近重复，保留每组中最先出现的一张，并将保留的图片加入索引
+
+        Args:
+            paths (list): 图片路径列表
+            max_distance (int): 视为重复的最大汉明距离
+
+        Returns:
+            tuple: (保留的路径列表, {被剔除路径: 与之重复的路径})
+        """
+        kept, duplicates = [], {}
+        for path in paths:
+            try:
+                value = self.hash_func(path)
+            except Exception as e:
+                logger.warning(f"计算哈希失败 {path}: {e}")
+                continue
+            dup = self.find_duplicate(value, max_distance)
+            if dup is not None:
+                duplicates[path] = dup
+            else:
+                self.add(path, value=value)
+                kept.append(path)
+        return kept, duplicates
+
+    def save(self, path):
+        """保存索引到 .npz 文件"""
+        np.savez(path, hashes=self.hashes, keys=np.array(self.keys, dtype=object))
+
+    @classmethod
+    def load(cls, path, hash_func=phash):
+        """从 .npz 文件加载索引"""
+        index = cls(hash_func=hash_func)
+        if os.path.exists(path):
+            data = np.load(path, allow_pickle=True)
+            for key, value in zip(data["keys"].tolist(), data["hashes"].tolist()):
+                index.add(key, value=int(value))
+        return index
+
+    @classmethod
+    def from_store(cls, store, hash_func=phash):
+        """为内容寻址存储(ContentStore)中的全部文件建立索引，key 为文件路径"""
+        index = cls(hash_func=hash_func)
+        for path in store.iter_paths():
+            try:
+                index.add(path)
+            except Exception as e:
+                logger.warning(f"计算哈希失败 {path}: {e}")
+        return index
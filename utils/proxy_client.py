@@ -0,0 +1,238 @@
+import time
+import asyncio
+import aiohttp
+import logging
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class ProxyLease:
+    """客户端缓存的代理租约，在本地统计使用结果，归还时一次性反馈给代理池"""
+
+    def __init__(self, data):
+        self.lease_id = data["lease_id"]
+        self.proxy = data["proxy"]
+        self.capability = data.get("capability")
+        self.max_concurrency = data["max_concurrency"]
+        self.ttl = data["ttl"]
+        # 使用本地单调时钟计算到期时间，避免与服务端时钟不一致
+        self.expires_at = time.monotonic() + self.ttl
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.active = 0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.released = False
+        self._latency_total = 0.0
+        self._latency_count = 0
+
+    def record(self, success, latency=None):
+        """
+        记录一次通过该代理的请求结果
+
+        Args:
+            success (bool): 请求是否成功
+            latency (float, optional): 请求耗时(秒)
+        """
+        if success:
+            self.successes += 1
+            self.consecutive_failures = 0
+            if latency is not None:
+                self._latency_total += latency
+                self._latency_count += 1
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+
+    def summary(self):
+        """
+        Returns:
+            tuple: (整体是否成功，没有请求时为None, 成功请求的平均耗时或None)
+        """
+        total = self.successes + self.failures
+        success = self.successes * 2 >= total if total else None
+        latency = self._latency_total / self._latency_count if self._latency_count else None
+        return success, latency
+
+    def expires_in(self):
+        return self.expires_at - time.monotonic()
+
+
+class ProxyClient:
+    """
+    代理池租约 API 的异步客户端
+
+    每种能力(upload/download)缓存少量租约，请求通过 use() 在租约的并发名额内复用代理，
+    后台任务为正在使用的租约续租、归还快到期的空闲租约，连续失败过多时提前归还并换新代理；
+    任何租约被丢弃时都会归还并反馈汇总结果 (即使服务端已判定过期)。
+    因此每个租约只需要一次租用和一次归还请求，而不是每个请求都访问代理池。
+    代理池不可用时 use() 返回None，调用方直接不使用代理。
+    """
+
+    def __init__(self, base_url="http://localhost:8000", ttl=60, max_concurrency=4, max_leases=4,
+                 renew_margin=10, max_failures=3, timeout=5):
+        """
+        Args:
+            base_url (str): 代理池 API 地址
+            ttl (float): 租约有效期(秒)
+            max_concurrency (int): 每个租约的最大并发请求数
+            max_leases (int): 每种能力最多同时持有的租约数
+            renew_margin (float): 距离到期不足该秒数时续租
+            max_failures (int): 租约连续失败多少次后提前归还
+            timeout (float): 访问代理池 API 的超时(秒)
+        """
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.max_concurrency = max_concurrency
+        self.max_leases = max_leases
+        self.renew_margin = renew_margin
+        self.max_failures = max_failures
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None
+        self._leases = {}  # 能力 -> [ProxyLease]
+        self._locks = {}  # 能力 -> asyncio.Lock，避免多个协程同时为同一能力租用
+        self._keepalive = None  # 后台续租任务
+        self.stats = {"leased": 0, "renewed": 0, "released": 0, "api_errors": 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _post(self, path, payload):
+        """调用代理池 API，成功时返回 data 字段，失败时返回None"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        try:
+            async with self._session.post(f"{self.base_url}{path}", json=payload) as response:
+                result = await response.json()
+            if result.get("success"):
+                return result.get("data") or {}
+        except Exception as e:
+            self.stats["api_errors"] += 1
+            logger.warning(f"访问代理池失败 {path}: {str(e)}")
+        return None
+
+    async def acquire(self, capability=None):
+        """
+        取得一个仍有并发名额的租约，必要时续租或租用新代理
+
+        Args:
+            capability (str, optional): 需要的代理能力，如 upload、download
+
+        Returns:
+            ProxyLease: 租约，代理池没有可用代理时返回None
+        """
+        if self._keepalive is None or self._keepalive.done():
+            self._keepalive = asyncio.ensure_future(self._keepalive_loop())
+        lock = self._locks.setdefault(capability, asyncio.Lock())
+        async with lock:
+            leases = self._leases.setdefault(capability, [])
+            for lease in [lease for lease in leases if lease.expires_in() <= 0]:
+                # 已过期的租约同样归还，服务端仍会记录其汇总结果
+                await self.release(lease)
+
+            for lease in sorted(leases, key=lambda lease: lease.active):
+                if lease.active >= lease.max_concurrency:
+                    continue
+                if lease.expires_in() < self.renew_margin and not await self._renew(lease):
+                    continue
+                return lease
+
+            if len(leases) < self.max_leases:
+                data = await self._post("/lease", {
+                    "capability": capability, "ttl": self.ttl, "max_concurrency": self.max_concurrency,
+                })
+                if data is not None:
+                    lease = ProxyLease(data)
+                    leases.append(lease)
+                    self.stats["leased"] += 1
+                    logger.info(f"租用代理: {lease.proxy} (能力: {capability}, 并发: {lease.max_concurrency})")
+                    return lease
+
+            # 无法租用更多代理时，排队等待负载最低的租约
+            return min(leases, key=lambda lease: lease.active) if leases else None
+
+    async def _renew(self, lease):
+        """续租，失败时归还租约 (反馈已有的汇总结果) 并返回False"""
+        data = await self._post(f"/lease/{lease.lease_id}/renew", {"ttl": self.ttl})
+        if data is None:
+            await self.release(lease)
+            return False
+        lease.expires_at = time.monotonic() + data.get("ttl", self.ttl)
+        self.stats["renewed"] += 1
+        return True
+
+    async def _keepalive_loop(self):
+        """
+        后台续租：use() 块可能持续超过租约有效期 (如一整张种子的下载)，
+        使用中的租约快到期时续租，空闲的租约直接归还
+        """
+        interval = max(self.renew_margin / 2, 0.1)
+        while True:
+            await asyncio.sleep(interval)
+            for capability, leases in list(self._leases.items()):
+                async with self._locks.setdefault(capability, asyncio.Lock()):
+                    for lease in list(leases):
+                        if lease.released or lease.expires_in() >= self.renew_margin:
+                            continue
+                        if lease.active:
+                            await self._renew(lease)
+                        else:
+                            await self.release(lease)
+
+    @asynccontextmanager
+    async def use(self, capability=None):
+        """
+        在租约的并发名额内使用代理，请求结果通过 lease.record() 记录，
+        抛出异常时自动记为失败
+
+        Yields:
+            ProxyLease: 租约，没有可用代理时为None
+        """
+        lease = await self.acquire(capability)
+        if lease is None:
+            yield None
+            return
+        async with lease.semaphore:
+            lease.active += 1
+            try:
+                yield lease
+            except Exception:
+                lease.record(False)
+                raise
+            finally:
+                lease.active -= 1
+        if lease.consecutive_failures >= self.max_failures:
+            logger.warning(f"代理连续失败 {lease.consecutive_failures} 次，提前归还: {lease.proxy}")
+            await self.release(lease)
+
+    async def release(self, lease):
+        """归还租约并反馈汇总后的使用结果"""
+        if lease.released:
+            return
+        lease.released = True
+        leases = self._leases.get(lease.capability, [])
+        if lease in leases:
+            leases.remove(lease)
+        success, latency = lease.summary()
+        await self._post(f"/lease/{lease.lease_id}/release", {"success": success, "latency": latency})
+        self.stats["released"] += 1
+
+    async def close(self):
+        """停止后台续租，归还全部租约并关闭会话"""
+        if self._keepalive is not None and not self._keepalive.done():
+            self._keepalive.cancel()
+            try:
+                await self._keepalive
+            except asyncio.CancelledError:
+                pass
+        self._keepalive = None
+        for leases in list(self._leases.values()):
+            for lease in list(leases):
+                await self.release(lease)
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,182 @@
+import io
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from PIL import Image
+
+from utils.phash_index import PHashIndex, phash
+
+logger = logging.getLogger(__name__)
+
+# 爬虫 (main.py) 与搜索服务 (app.py) 默认共用的缓存文件，位于项目根目录，与启动时的工作目录无关
+DEFAULT_SEARCH_CACHE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    "search_cache.sqlite3")
+
+
+class SearchCache:
+    """
+    基于 SQLite 的持久化搜索结果缓存，按种子图片内容寻址
+
+    以图片字节的 SHA-256 为键保存结果列表，同一张图片再次搜索时不再上传和请求结果接口；
+    可选按感知哈希 (phash) 匹配，图片被重新编码或缩放后仍能命中。
+    条目超过 ttl 后失效，条目数超过 max_entries 时按最近访问时间淘汰。
+    各方法是同步的，可在线程中调用 (asyncio.to_thread)，内部加锁保证线程安全。
+    """
+
+    def __init__(self, db_path=DEFAULT_SEARCH_CACHE, ttl=86400, max_entries=10000, use_phash=False,
+                 phash_distance=4):
+        """
+        Args:
+            db_path (str): 缓存数据库文件路径
+            ttl (float): 条目有效期(秒)
+            max_entries (int): 最多保留的条目数
+            use_phash (bool): 精确匹配未命中时是否按感知哈希匹配
+            phash_distance (int): 感知哈希允许的最大汉明距离
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.use_phash = use_phash
+        self.phash_distance = phash_distance
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # phash 以十六进制文本保存，避免 64 位无符号整数超出 SQLite INTEGER 范围
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            "digest TEXT PRIMARY KEY, phash TEXT, result_limit INTEGER, result TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_searches_accessed ON searches (accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_searches_phash ON searches (phash)")
+        self._conn.commit()
+        self._phash_index = None  # 感知哈希的 BK 树索引，首次按感知哈希查找时从数据库建立
+        self.stats = {"hits": 0, "phash_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def get(self, image_bytes, limit=None):
+        """
+        查找图片的缓存结果
+
+        Args:
+            image_bytes (bytes): 种子图片字节
+            limit (int, optional): 需要的结果数，缓存的结果是按更小的 limit 搜索得到时视为未命中
+
+        Returns:
+            dict: 缓存的搜索结果，未命中时返回None
+        """
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        with self._lock:
+            row = self._lookup("digest = ?", (digest,), limit)
+            if row is None and self.use_phash:
+                row = self._lookup_phash(image_bytes, limit)
+                if row is not None:
+                    self.stats["phash_hits"] += 1
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self._conn.execute("UPDATE searches SET accessed_at = ? WHERE digest = ?", (time.time(), row[0]))
+            self._conn.commit()
+        return json.loads(row[1])
+
+    def put(self, image_bytes, result, limit=None):
+        """
+        保存图片的搜索结果
+
+        Args:
+            image_bytes (bytes): 种子图片字节
+            result (dict): 可 JSON 序列化的搜索结果
+            limit (int, optional): 搜索时使用的结果数上限，None 表示完整结果
+        """
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        value = _image_phash(image_bytes) if self.use_phash else None
+        text = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO searches (digest, phash, result_limit, result, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (digest, value, limit, text, now, now),
+                )
+                self._evict(now)
+            if value is not None and self._phash_index is not None:
+                self._phash_index.add(digest, value=int(value, 16))
+                # 被替换和淘汰的条目仍留在索引中，查找时按数据库校验；过多时下次查找前重建
+                if len(self._phash_index) > 2 * self.max_entries:
+                    self._phash_index = None
+            self.stats["stores"] += 1
+
+    def _lookup(self, where, params, limit):
+        """返回未过期且结果数满足 limit 的 (digest, result)"""
+        sql = f"SELECT digest, result FROM searches WHERE {where} AND created_at >= ?"
+        params += (time.time() - self.ttl,)
+        if limit:
+            sql += " AND (result_limit IS NULL OR result_limit >= ?)"
+            params += (limit,)
+        else:
+            sql += " AND result_limit IS NULL"
+        return self._conn.execute(sql + " ORDER BY created_at DESC LIMIT 1", params).fetchone()
+
+    def _lookup_phash(self, image_bytes, limit):
+        value = _image_phash(image_bytes)
+        if value is None:
+            return None
+        if not self.phash_distance:
+            return self._lookup("phash = ?", (value,), limit)
+        if self._phash_index is None:
+            self._phash_index = self._build_phash_index()
+        # 按距离从近到远检查候选，跳过已过期、已淘汰或结果数不足的条目
+        for digest, _ in self._phash_index.query(int(value, 16), self.phash_distance):
+            row = self._lookup("digest = ?", (digest,), limit)
+            if row is not None:
+                return row
+        return None
+
+    def _build_phash_index(self):
+        index = PHashIndex()
+        rows = self._conn.execute("SELECT digest, phash FROM searches WHERE phash IS NOT NULL")
+        for digest, value in rows:
+            index.add(digest, value=int(value, 16))
+        return index
+
+    def _evict(self, now):
+        """删除过期条目，条目数仍超出上限时删除最久未访问的条目"""
+        evicted = self._conn.execute("DELETE FROM searches WHERE created_at < ?", (now - self.ttl,)).rowcount
+        excess = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0] - self.max_entries
+        if excess > 0:
+            evicted += self._conn.execute(
+                "DELETE FROM searches WHERE digest IN "
+                "(SELECT digest FROM searches ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            ).rowcount
+        self.stats["evictions"] += evicted
+
+    def summary(self):
+        """缓存统计，包含条目数和命中率"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = round(self.stats["hits"] / lookups, 4) if lookups else None
+        return {**self.stats, "entries": entries, "hit_rate": hit_rate}
+
+    def close(self):
+        """关闭缓存数据库"""
+        with self._lock:
+            self._conn.close()
+
+
+def _image_phash(image_bytes):
+    """计算图片字节的感知哈希 (十六进制)，无法解码时返回None"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return f"{phash(img):016x}"
+    except Exception as e:
+        logger.warning(f"计算感知哈希失败: {str(e)}")
+        return None
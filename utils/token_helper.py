@@ -1,5 +1,7 @@
 import asyncio
+import io
 import os
+import logging
 import json
 import time
 from playwright.sync_api import sync_playwright
@@ -10,22 +12,22 @@ TARGET_URL = "https://image.baidu.com/"
 # Target URL - Baidu Image Search PC Page
 TARGET_URL = "https://graph.baidu.com/pcpage/index?tpl_from=pc"
 TOKEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "acs_token.json")
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+BROWSER_ARGS = ['--disable-blink-features=AutomationControlled']
 
-def _ensure_dummy_image():
-    """Create a dummy image for upload simulation if not exists."""
-    dummy_path = os.path.join(os.getcwd(), "dummy.jpg")
-    if not os.path.exists(dummy_path):
-        with open(dummy_path, "wb") as f:
-            f.write(b"fake image content")
-    return dummy_path
+logger = logging.getLogger(__name__)
 
-def _remove_dummy_image(path):
-    """Remove the dummy image."""
-    try:
-        if os.path.exists(path):
-            os.remove(path)
-    except Exception:
-        pass
+_dummy_image = None
+
+def _dummy_upload_file():
+    """In-memory JPEG for upload simulation, passed to set_input_files without touching the disk."""
+    global _dummy_image
+    if _dummy_image is None:
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), (255, 255, 255)).save(buffer, format="JPEG")
+        _dummy_image = buffer.getvalue()
+    return {"name": "dummy.jpg", "mimeType": "image/jpeg", "buffer": _dummy_image}
 
 def _save_token_to_disk(token):
     """Save token to disk with timestamp."""
@@ -40,8 +42,8 @@ def _save_token_to_disk(token):
     except Exception as e:
         print(f"Failed to save token: {e}")
 
-def _load_token_from_disk(max_age=900):
-    """Load token from disk. If older than max_age seconds, return None."""
+def _load_token_record(max_age=900):
+    """Load the token record ({"token", "updated_at"}) from disk. If older than max_age seconds, return None."""
     if not os.path.exists(TOKEN_FILE):
         return None
     try:
@@ -51,11 +53,16 @@ def _load_token_from_disk(max_age=900):
             if time.time() - updated_at > max_age:
                 print("Token on disk is expired.")
                 return None
-            return data.get("token")
+            return data if data.get("token") else None
     except Exception as e:
         print(f"Failed to load token: {e}")
         return None
 
+def _load_token_from_disk(max_age=900):
+    """Load token from disk. If older than max_age seconds, return None."""
+    data = _load_token_record(max_age)
+    return data["token"] if data else None
+
 def get_acs_token_sync(force_refresh=False):
     """
     Synchronously get acs-token using Playwright.
@@ -67,17 +74,11 @@ def get_acs_token_sync(force_refresh=False):
             return token
 
     token = None
-    dummy_path = _ensure_dummy_image()
     
     with sync_playwright() as p:
         # Launch browser with stealth args
-        browser = p.chromium.launch(
-            headless=True,
-            args=['--disable-blink-features=AutomationControlled']
-        )
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
+        browser = p.chromium.launch(headless=True, args=BROWSER_ARGS)
+        context = browser.new_context(user_agent=USER_AGENT)
         page = context.new_page()
         
         def handle_request(request):
@@ -102,11 +103,14 @@ def get_acs_token_sync(force_refresh=False):
                 file_input = page.wait_for_selector('input[type="file"]', state="attached", timeout=5000)
                 if file_input:
                     print("Uploading dummy file...")
-                    # Must provide absolute path
-                    file_input.set_input_files(dummy_path)
+                    # The dummy image is passed from memory
+                    file_input.set_input_files(_dummy_upload_file())
                     
-                    # Wait for upload request to be sent
-                    page.wait_for_timeout(5000)
+                    # Wait for the upload request carrying the token
+                    for _ in range(50):
+                        if token:
+                            break
+                        page.wait_for_timeout(100)
             except Exception as e:
                 print(f"Error during upload simulation: {e}")
 
@@ -119,16 +123,153 @@ def get_acs_token_sync(force_refresh=False):
             print(f"Error occurred while fetching token: {e}")
         finally:
             browser.close()
-            _remove_dummy_image(dummy_path)
     
     if token:
         _save_token_to_disk(token)
             
     return token
 
-async def get_acs_token_async(force_refresh=False):
+
+class TokenBrowser:
+    """
+    Long-lived headless Chromium kept on the Baidu PC upload page.
+
+    Minting a token only re-triggers the upload on the warm page and captures the
+    acs-token header of the outgoing request, instead of launching a browser each time.
+    The browser is restarted automatically when it crashes or the page is closed.
+    """
+
+    def __init__(self, headless=True, mint_timeout=5, navigation_timeout=15000):
+        """
+        Args:
+            headless: Run Chromium headless.
+            mint_timeout: Seconds to wait for the upload request carrying the token.
+            navigation_timeout: Milliseconds allowed for loading the upload page.
+        """
+        self.headless = headless
+        self.mint_timeout = mint_timeout
+        self.navigation_timeout = navigation_timeout
+        self._playwright = None
+        self._browser = None
+        self._page = None
+        self._waiter = None  # future resolved by the next request carrying an acs-token
+        self._rewarm = None  # background navigation back to the upload page
+        self._lock = asyncio.Lock()
+        self.restarts = 0
+
+    @property
+    def alive(self):
+        return (self._browser is not None and self._browser.is_connected()
+                and self._page is not None and not self._page.is_closed())
+
+    async def start(self):
+        """Launch the browser and open the upload page (no-op when already running)."""
+        if self.alive:
+            return
+        await self._shutdown()
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=self.headless, args=BROWSER_ARGS)
+        context = await self._browser.new_context(user_agent=USER_AGENT)
+        self._page = await context.new_page()
+        self._page.on("request", self._handle_request)
+        await self._warm()
+        logger.info("Token browser started")
+
+    async def _warm(self):
+        """Navigate to the upload page unless the file input is already there."""
+        if await self._page.query_selector('input[type="file"]') is None:
+            await self._page.goto(TARGET_URL, wait_until="domcontentloaded", timeout=self.navigation_timeout)
+
+    async def _handle_request(self, request):
+        if self._waiter is None or self._waiter.done():
+            return
+        headers = await request.all_headers()
+        token = headers.get("acs-token")
+        if token and not self._waiter.done():
+            self._waiter.set_result(token)
+
+    async def mint(self):
+        """
+        Capture a fresh acs-token by re-triggering the upload on the warm page.
+        Retries once after restarting the browser.
+
+        Returns:
+            str: The token, or None if none was captured.
+        """
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    return await self._mint_once()
+                except Exception as e:
+                    logger.warning(f"Token browser failed ({e}), restarting...")
+                    await self._shutdown()
+                    self.restarts += 1
+            return None
+
+    async def _mint_once(self):
+        await self.start()
+        if self._rewarm is not None:
+            rewarm, self._rewarm = self._rewarm, None
+            try:
+                await rewarm
+            except Exception:
+                pass
+        await self._warm()
+
+        self._waiter = asyncio.get_running_loop().create_future()
+        try:
+            file_input = await self._page.wait_for_selector('input[type="file"]', state="attached", timeout=5000)
+            await file_input.set_input_files(_dummy_upload_file())
+            token = await asyncio.wait_for(self._waiter, timeout=self.mint_timeout)
+        except asyncio.TimeoutError:
+            token = None
+        finally:
+            self._waiter = None
+        # The upload may navigate away; return to the upload page in the background
+        self._rewarm = asyncio.ensure_future(self._warm())
+        return token
+
+    async def _shutdown(self):
+        if self._rewarm is not None and not self._rewarm.done():
+            self._rewarm.cancel()
+        self._rewarm = None
+        try:
+            if self._browser is not None:
+                await self._browser.close()
+        except Exception:
+            pass
+        try:
+            if self._playwright is not None:
+                await self._playwright.stop()
+        except Exception:
+            pass
+        self._playwright = self._browser = self._page = None
+
+    async def close(self):
+        """Close the browser and stop Playwright."""
+        async with self._lock:
+            await self._shutdown()
+
+
+_shared_browser = None
+_shared_loop = None
+
+def get_token_browser():
+    """
+    Process-wide warm token browser for ad-hoc get_acs_token_async calls.
+    Bound to the running event loop: a new asyncio.run gets a fresh browser, since the
+    lock and Playwright objects of the old one cannot be used from another loop.
+    """
+    global _shared_browser, _shared_loop
+    loop = asyncio.get_running_loop()
+    if _shared_browser is None or _shared_loop is not loop:
+        _shared_browser = TokenBrowser()
+        _shared_loop = loop
+    return _shared_browser
+
+async def get_acs_token_async(force_refresh=False, browser=None):
     """
-    Asynchronously get acs-token using Playwright.
+    Asynchronously get acs-token from a warm Playwright page.
     If force_refresh is False, tries to load from disk first.
     """
     if not force_refresh:
@@ -136,53 +277,176 @@ async def get_acs_token_async(force_refresh=False):
         if token:
             return token
 
-    token = None
-    dummy_path = _ensure_dummy_image()
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=['--disable-blink-features=AutomationControlled']
-        )
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = await context.new_page()
-        
-        async def handle_request(request):
-            nonlocal token
-            headers = await request.all_headers()
-            if "acs-token" in headers:
-                # print(f"Found token in request to: {request.url}")
-                token = headers["acs-token"]
-        
-        page.on("request", handle_request)
-        
-        try:
-            await page.goto(TARGET_URL, wait_until="domcontentloaded", timeout=15000)
-            
-            try:
-                file_input = await page.wait_for_selector('input[type="file"]', state="attached", timeout=5000)
-                if file_input:
-                    await file_input.set_input_files(dummy_path)
-                    await page.wait_for_timeout(5000)
-            except Exception:
-                pass
-            
-            if not token:
-                 await page.wait_for_timeout(2000)
-                 
-        except Exception as e:
-            print(f"Error occurred while fetching token: {e}")
-        finally:
-            await browser.close()
-            _remove_dummy_image(dummy_path)
+    browser = browser or get_token_browser()
+    try:
+        token = await browser.mint()
+    except Exception as e:
+        print(f"Error occurred while fetching token: {e}")
+        token = None
     
     if token:
         _save_token_to_disk(token)
             
     return token
 
+class TokenManager:
+    """
+    Keeps acs-tokens ready so uploads never wait on Playwright.
+
+    - Concurrent refreshes collapse into one in-flight mint task (single-flight).
+    - A background task keeps `pool_size` fresh tokens and re-mints them before they expire.
+    - A token rejected by the server is dropped with `invalidate()`; the next pre-minted one is used at once.
+    """
+
+    def __init__(self, mint=None, ttl=1800, refresh_margin=300, pool_size=2, retry_delay=10, disk_max_age=900):
+        """
+        Args:
+            mint: async callable returning a new token or None. Defaults to a forced refresh on a
+                TokenBrowser owned by this manager, so closing one manager never affects another.
+            ttl: Seconds a token is considered valid after minting.
+            refresh_margin: Tokens closer than this to expiry are replaced in the background.
+            pool_size: Number of pre-minted tokens to keep, at least 1.
+            retry_delay: Seconds to wait after a failed mint before retrying in the background.
+            disk_max_age: Max age of the token cached on disk to seed the pool with.
+        """
+        if pool_size < 1:
+            raise ValueError(f"pool_size must be at least 1, got {pool_size}")
+        self.mint = mint or self._mint_with_browser
+        self._browser = None  # own TokenBrowser, created on first default mint
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.pool_size = pool_size
+        self.retry_delay = retry_delay
+        self._tokens = []  # [(token, minted_at)], oldest first
+        self._inflight = None  # the single in-flight mint task
+        self._background = None
+        self._wakeup = None
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "failures": 0, "invalidated": 0,
+                      "last_refresh_latency": None, "total_refresh_latency": 0.0}
+
+        record = _load_token_record(disk_max_age)
+        if record:
+            self._tokens.append((record["token"], record["updated_at"]))
+
+    def _prune(self):
+        """Drop expired tokens."""
+        now = time.time()
+        self._tokens = [(t, minted_at) for t, minted_at in self._tokens if now - minted_at < self.ttl]
+
+    @property
+    def fresh_count(self):
+        """Tokens that are not yet due for proactive refresh."""
+        now = time.time()
+        return sum(1 for _, minted_at in self._tokens if now - minted_at < self.ttl - self.refresh_margin)
+
+    async def get_token(self):
+        """Return a valid token, waiting for a mint only when none is available."""
+        self.start()
+        self._prune()
+        if self._tokens:
+            self.stats["hits"] += 1
+            # Prefer the newest token: it stays valid the longest
+            token = self._tokens[-1][0]
+        else:
+            self.stats["misses"] += 1
+            token = await self.refresh()
+        if self.fresh_count < self.pool_size:
+            self._wake()
+        return token
+
+    def invalidate(self, token):
+        """Drop a token that the server rejected and wake the background refresher."""
+        before = len(self._tokens)
+        self._tokens = [(t, minted_at) for t, minted_at in self._tokens if t != token]
+        if len(self._tokens) != before:
+            self.stats["invalidated"] += 1
+        self._wake()
+
+    async def refresh(self):
+        """Mint a new token. Concurrent callers share the same in-flight mint."""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._mint_once())
+        # shield: one cancelled waiter must not cancel the mint for everyone else
+        return await asyncio.shield(self._inflight)
+
+    async def _mint_with_browser(self):
+        if self._browser is None:
+            self._browser = TokenBrowser()
+        return await get_acs_token_async(force_refresh=True, browser=self._browser)
+
+    async def _mint_once(self):
+        start = time.monotonic()
+        try:
+            token = await self.mint()
+        except Exception as e:
+            logger.error(f"Failed to mint acs-token: {e}")
+            token = None
+        latency = time.monotonic() - start
+        self.stats["last_refresh_latency"] = latency
+        if token:
+            self.stats["refreshes"] += 1
+            self.stats["total_refresh_latency"] += latency
+            self._tokens = [(t, m) for t, m in self._tokens if t != token]
+            self._tokens.append((token, time.time()))
+            # Keep at most pool_size tokens, dropping the oldest
+            del self._tokens[:-self.pool_size]
+            logger.info(f"Minted acs-token in {latency:.2f}s, pool size: {len(self._tokens)}")
+        else:
+            self.stats["failures"] += 1
+        return token
+
+    def summary(self):
+        """Hit/miss counters, pool size and refresh latency."""
+        self._prune()
+        refreshes = self.stats["refreshes"]
+        return {
+            **self.stats,
+            "pool_size": len(self._tokens),
+            "average_refresh_latency": self.stats["total_refresh_latency"] / refreshes if refreshes else None,
+        }
+
+    def start(self):
+        """Start the background refresher (idempotent, needs a running event loop)."""
+        if self._background is None or self._background.done():
+            self._wakeup = asyncio.Event()
+            self._background = asyncio.ensure_future(self._run())
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._prune()
+            if self.fresh_count < self.pool_size:
+                token = await self.refresh()
+                if not token:
+                    await asyncio.sleep(self.retry_delay)
+                continue
+            # Sleep until the oldest token is due for refresh, or until woken up
+            oldest = min(minted_at for _, minted_at in self._tokens)
+            delay = max(oldest + self.ttl - self.refresh_margin - time.time(), 0)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        """Stop the background refresher and close this manager's browser."""
+        for task in (self._background, self._inflight):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._background = None
+        self._inflight = None
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+
 if __name__ == "__main__":
     print("Testing sync token fetch (force_refresh=True)...")
     t = get_acs_token_sync(force_refresh=True)
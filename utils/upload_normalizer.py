@@ -0,0 +1,121 @@
+import io
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 文件头 -> (Content-Type, 扩展名)
+_MAGIC_TYPES = (
+    (b"\xff\xd8\xff", ("image/jpeg", ".jpg")),
+    (b"\x89PNG\r\n\x1a\n", ("image/png", ".png")),
+    (b"GIF87a", ("image/gif", ".gif")),
+    (b"GIF89a", ("image/gif", ".gif")),
+    (b"BM", ("image/bmp", ".bmp")),
+)
+
+
+def detect_image_type(image_bytes):
+    """
+    根据文件头判断图片类型，无法识别时按 JPEG 处理
+
+    Returns:
+        tuple: (Content-Type, 扩展名)
+    """
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    for magic, result in _MAGIC_TYPES:
+        if image_bytes.startswith(magic):
+            return result
+    return "image/jpeg", ".jpg"
+
+
+class UploadNormalizer:
+    """
+    上传前的图片规范化：长边缩小到 max_edge 以内并重新编码为 JPEG
+
+    编码在线程池中执行，不阻塞事件循环；结果按原图 SHA-256 缓存，
+    同一张种子图片重试或重复搜索时不会重新编码。
+    已经是足够小的 JPEG、或重新编码后反而更大时保留原图。
+    """
+
+    def __init__(self, max_edge=1024, quality=85, max_workers=2, cache_size=64):
+        """
+        Args:
+            max_edge (int): 长边最大像素数
+            quality (int): JPEG 质量 (1-95)
+            max_workers (int): 编码线程数
+            cache_size (int): 缓存的种子图片数
+        """
+        self.max_edge = max_edge
+        self.quality = quality
+        self.cache_size = cache_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload-normalize")
+        self._cache = OrderedDict()  # 原图摘要 -> (图片字节, Content-Type, 文件名)
+        self.stats = {"hits": 0, "normalized": 0, "kept": 0, "bytes_in": 0, "bytes_out": 0}
+
+    async def normalize(self, image_bytes):
+        """
+        Returns:
+            tuple: (上传用的图片字节, Content-Type, 文件名)
+        """
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        cached = self._cache.get(digest)
+        if cached is not None:
+            self._cache.move_to_end(digest)
+            self.stats["hits"] += 1
+            return cached
+
+        loop = asyncio.get_running_loop()
+        result, outcome = await loop.run_in_executor(self._executor, self._normalize_sync, image_bytes)
+        # 统计只在事件循环中更新，编码线程不直接修改共享字典
+        self.stats[outcome] += 1
+        self.stats["bytes_in"] += len(image_bytes)
+        self.stats["bytes_out"] += len(result[0])
+        self._cache[digest] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def _normalize_sync(self, image_bytes):
+        """在编码线程中执行，返回 (结果, "normalized" 或 "kept")"""
+        content_type, ext = detect_image_type(image_bytes)
+        original = (image_bytes, content_type, f"image{ext}")
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                oversized = max(img.size) > self.max_edge
+                if not oversized and content_type == "image/jpeg":
+                    return original, "kept"
+                img = _to_rgb(img)
+                if oversized:
+                    img.thumbnail((self.max_edge, self.max_edge), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                img.save(buffer, format="JPEG", quality=self.quality, optimize=True)
+        except Exception as e:
+            logger.warning(f"图片规范化失败，使用原图上传: {str(e)}")
+            return original, "kept"
+
+        data = buffer.getvalue()
+        if not oversized and len(data) >= len(image_bytes):
+            # 尺寸已满足且重新编码没有变小，保留原图
+            return original, "kept"
+        logger.info(f"上传图片规范化: {len(image_bytes)} -> {len(data)} bytes")
+        return (data, "image/jpeg", "image.jpg"), "normalized"
+
+    def close(self):
+        """关闭编码线程池"""
+        self._executor.shutdown(wait=False)
+
+
+def _to_rgb(img):
+    """转换为 RGB，透明区域填充白色"""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")